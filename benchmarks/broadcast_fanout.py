@@ -0,0 +1,98 @@
+"""
+Compares the old broadcast path (pydantic ``.json()`` and one awaited
+send_text per socket) with the serialize-once path through ConnectionManager.
+
+The sockets never block, so the legacy column is its best case: with real
+clients every awaited send adds the slowest socket's latency to the room.
+
+    python -m benchmarks.broadcast_fanout
+"""
+
+import asyncio
+import warnings
+
+from benchmarks.common import NullWebSocket, SendCounter, Timer
+from comments.serializers import CommentCreate
+from websocket_package.brokers import InMemoryBroker
+from websocket_package.manager import ConnectionManager
+from websocket_package.serialization import dump_model
+
+ROOM_SIZES = (10, 100, 1000)
+# Stays below WS_OUTBOUND_QUEUE_SIZE, nobody gets evicted during the run.
+EVENTS = 50
+ENCODE_ROUNDS = 10_000
+
+
+def make_comment() -> CommentCreate:
+    return CommentCreate(
+        user_id=1,
+        username="benchmark",
+        email="benchmark@example.com",
+        profile_picture="https://test.backendserviceforumapi.online/uploads/default.jpg",
+        content="Lorem ipsum dolor sit amet, consectetur adipiscing elit.",
+    )
+
+
+async def legacy_broadcast(room_size: int) -> float:
+    counter = SendCounter()
+    sockets = [NullWebSocket(counter=counter) for _ in range(room_size)]
+    with warnings.catch_warnings(), Timer() as timer:
+        warnings.simplefilter("ignore")
+        for _ in range(EVENTS):
+            message = make_comment().json()
+            for socket in sockets:
+                await socket.send_text(message)
+    return timer.elapsed
+
+
+async def manager_broadcast(room_size: int, binary: bool) -> float:
+    counter = SendCounter()
+    manager = ConnectionManager(broker=InMemoryBroker())
+    await manager.start()
+    query_params = {"frames": "binary"} if binary else {}
+    for _ in range(room_size):
+        await manager.connect(NullWebSocket(query_params, counter), 1, "post")
+
+    counter.expect(EVENTS * room_size)
+    with Timer() as timer:
+        for _ in range(EVENTS):
+            await manager.broadcast(dump_model(make_comment()), 1, "post")
+            await asyncio.sleep(0)
+        await counter.done.wait()
+    await manager.stop()
+    return timer.elapsed
+
+
+def encode_cost() -> tuple[float, float]:
+    comment = make_comment()
+    with warnings.catch_warnings(), Timer() as legacy:
+        warnings.simplefilter("ignore")
+        for _ in range(ENCODE_ROUNDS):
+            comment.json()
+    with Timer() as current:
+        for _ in range(ENCODE_ROUNDS):
+            dump_model(comment)
+    return legacy.elapsed / ENCODE_ROUNDS, current.elapsed / ENCODE_ROUNDS
+
+
+async def main():
+    legacy, current = encode_cost()
+    print(
+        f"encode per event: .json() {legacy * 1e6:.2f} us, "
+        f"orjson {current * 1e6:.2f} us"
+    )
+    print(f"{EVENTS} events per room, microseconds per delivered frame")
+    print(f"{'room':>6} {'legacy':>10} {'text':>10} {'binary':>10}")
+    for room_size in ROOM_SIZES:
+        frames = EVENTS * room_size
+        legacy = await legacy_broadcast(room_size)
+        text = await manager_broadcast(room_size, binary=False)
+        binary = await manager_broadcast(room_size, binary=True)
+        print(
+            f"{room_size:>6} {legacy / frames * 1e6:>10.2f} "
+            f"{text / frames * 1e6:>10.2f} {binary / frames * 1e6:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""
+Comments persisted per second over a single DB connection, one INSERT and
+commit per comment against the write-behind batches.
+
+No database is needed: the session below charges a fixed round trip per
+statement and an fsync per commit, and holds a lock for it the way one
+pooled connection would. Change the constants to match your deployment.
+
+    python -m benchmarks.comment_write_behind
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from benchmarks.common import Timer
+from comments import write_behind
+from comments.views import save_comment
+from comments.write_behind import CommentWriter
+
+ROUND_TRIP_SECONDS = 0.0005
+FSYNC_SECONDS = 0.001
+# Server side cost of every extra row in a multi-row INSERT.
+ROW_SECONDS = 0.00001
+COMMENTERS = 50
+DURATION_SECONDS = 1.0
+
+
+class SingleConnectionSession:
+    def __init__(self):
+        self.connection = asyncio.Lock()
+        self.rows = 0
+        self.busy = 0.0
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def _round_trip(self, seconds: float):
+        async with self.connection:
+            await asyncio.sleep(seconds)
+            self.busy += seconds
+
+    def add(self, instance):
+        self.rows += 1
+
+    async def execute(self, statement, rows):
+        await self._round_trip(ROUND_TRIP_SECONDS + ROW_SECONDS * len(rows))
+        self.rows += len(rows)
+        first_id = self.rows - len(rows) + 1
+        return SimpleNamespace(
+            scalars=lambda: SimpleNamespace(
+                all=lambda: list(range(first_id, first_id + len(rows)))
+            )
+        )
+
+    async def commit(self):
+        # The INSERT is flushed by the commit when it was only add()ed.
+        await self._round_trip(ROUND_TRIP_SECONDS * 2 + FSYNC_SECONDS)
+
+    async def refresh(self, instance):
+        await self._round_trip(ROUND_TRIP_SECONDS)
+        instance.id = self.rows
+
+
+async def nothing(*args):
+    pass
+
+
+async def run(write_behind_mode: bool) -> tuple[int, float]:
+    session = SingleConnectionSession()
+    writer = CommentWriter(session, nothing)
+    writer.start()
+    user = SimpleNamespace(
+        id=1, username="benchmark", email="benchmark@example.com", profile_picture=""
+    )
+    deadline = asyncio.get_running_loop().time() + DURATION_SECONDS
+
+    async def commenter():
+        while asyncio.get_running_loop().time() < deadline:
+            if write_behind_mode:
+                writer.add(user, 1, "Lorem ipsum dolor sit amet.")
+                # A client waits for its comment to come back before the next.
+                await asyncio.sleep(0.001)
+            else:
+                await save_comment(session, user, 1, "Lorem ipsum dolor sit amet.")
+
+    with Timer() as timer:
+        await asyncio.gather(*(commenter() for _ in range(COMMENTERS)))
+        await writer.stop()
+    return round(session.rows / timer.elapsed), session.busy / timer.elapsed
+
+
+async def main():
+    print(
+        f"{COMMENTERS} commenters, round trip {ROUND_TRIP_SECONDS * 1000} ms, "
+        f"fsync {FSYNC_SECONDS * 1000} ms, flush every "
+        f"{write_behind.FLUSH_INTERVAL_SECONDS * 1000:.0f} ms"
+    )
+    print(f"{'mode':>13} {'comments/s':>11} {'connection busy':>16}")
+    for name, mode in (("per-comment", False), ("write-behind", True)):
+        rate, busy = await run(mode)
+        print(f"{name:>13} {rate:>11} {busy:>16.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
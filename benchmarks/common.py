@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+
+class NullWebSocket:
+    """Accepts every frame instantly and only counts what it was sent."""
+
+    def __init__(self, query_params: dict = None, counter: "SendCounter" = None):
+        self.client = "benchmark"
+        self.scope = {"subprotocols": []}
+        self.query_params = query_params or {}
+        self.counter = counter
+
+    async def accept(self, subprotocol: str = None):
+        pass
+
+    async def send_text(self, message: str):
+        self.counter.add(len(message))
+
+    async def send_bytes(self, message: bytes):
+        self.counter.add(len(message))
+
+    async def close(self, code: int = 1000, reason: str = None):
+        pass
+
+
+class SendCounter:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.expected = 0
+        self.done = asyncio.Event()
+
+    def expect(self, frames: int):
+        self.frames = 0
+        self.bytes = 0
+        self.expected = frames
+        self.done.clear()
+
+    def add(self, size: int):
+        self.frames += 1
+        self.bytes += size
+        if self.frames >= self.expected:
+            self.done.set()
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
@@ -0,0 +1,97 @@
+"""
+Chat delivery latency while a viral post saturates the loop: a room of
+5000 listeners gets comments at rates the loop barely keeps up with, while
+small chats exchange messages. Run once with the fan-out budget turned off
+(every fan-out queued in one go, as before) and once with the default lanes.
+
+    python -m benchmarks.fair_scheduling
+"""
+
+import asyncio
+import statistics
+
+import orjson
+
+from benchmarks.common import NullWebSocket, SendCounter
+from websocket_package.brokers import InMemoryBroker
+from websocket_package.manager import ConnectionManager
+from websocket_package.serialization import dumps
+
+HOT_ROOM_LISTENERS = 5000
+CHATS = 20
+DURATION_SECONDS = 2.0
+COMMENTS_PER_SECOND = (40, 80)
+CHAT_MESSAGES_PER_SECOND = 100
+
+
+class LatencyWebSocket(NullWebSocket):
+    """Records how long each message took from broadcast() to the socket."""
+
+    def __init__(self, latencies: list):
+        super().__init__(counter=SendCounter())
+        self.latencies = latencies
+
+    async def send_text(self, message: str):
+        sent_at = orjson.loads(message)["sent_at"]
+        self.latencies.append(asyncio.get_running_loop().time() - sent_at)
+
+
+async def publish(manager, rate: int, group_type: str, rooms: int):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for i in range(int(rate * DURATION_SECONDS)):
+        delay = started + i / rate - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        payload = dumps({"sent_at": loop.time(), "content": "Lorem ipsum dolor."})
+        await manager.broadcast(payload, i % rooms + 1, group_type)
+
+
+async def run(scheduled: bool, comment_rate: int) -> tuple[list[float], int, int]:
+    manager = ConnectionManager(broker=InMemoryBroker())
+    if not scheduled:
+        manager.send_budget = 10**9
+        manager.lane_weights = {}
+    await manager.start()
+    counter = SendCounter()
+    for _ in range(HOT_ROOM_LISTENERS):
+        await manager.connect(NullWebSocket(counter=counter), 1, "post")
+    latencies = []
+    for chat_id in range(1, CHATS + 1):
+        for _ in range(2):
+            await manager.connect(LatencyWebSocket(latencies), chat_id, "chat")
+
+    await asyncio.gather(
+        publish(manager, comment_rate, "post", 1),
+        publish(manager, CHAT_MESSAGES_PER_SECOND, "chat", CHATS),
+    )
+    await asyncio.sleep(0.5)
+    comments_sent, evicted = counter.frames, manager.evicted_count
+    await manager.stop()
+    return latencies, comments_sent, evicted
+
+
+def main():
+    print(
+        f"{HOT_ROOM_LISTENERS} listeners on one post,"
+        f" {CHAT_MESSAGES_PER_SECOND} chat messages/s, chat latency"
+    )
+    print(
+        f"{'comments/s':>10} {'scheduler':>10} {'p50 ms':>8} {'p99 ms':>8}"
+        f" {'max ms':>8} {'comment frames':>15} {'evicted':>8}"
+    )
+    for comment_rate in COMMENTS_PER_SECOND:
+        for scheduled in (False, True):
+            latencies, comments_sent, evicted = asyncio.run(
+                run(scheduled, comment_rate)
+            )
+            cuts = statistics.quantiles(latencies, n=100)
+            print(
+                f"{comment_rate:>10} {'on' if scheduled else 'off':>10}"
+                f" {cuts[49] * 1000:>8.2f} {cuts[98] * 1000:>8.2f}"
+                f" {max(latencies) * 1000:>8.2f} {comments_sent:>15} {evicted:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
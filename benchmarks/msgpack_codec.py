@@ -0,0 +1,114 @@
+"""
+Size and CPU of JSON against msgpack for the payloads the API sends: a
+socket comment, a chat message with files and a page of 50 posts.
+
+Socket events are published as JSON, a msgpack socket pays one transcode
+per event (shared by all its msgpack recipients), shown as "transcode".
+
+    python -m benchmarks.msgpack_codec
+"""
+
+import warnings
+from datetime import datetime
+
+import orjson
+
+from benchmarks.common import Timer
+from websocket_package.serialization import dumps, json_to_msgpack, packb, unpackb
+
+ROUNDS = 20_000
+
+
+def comment() -> dict:
+    return {
+        "user_id": 1234,
+        "username": "benchmark",
+        "email": "benchmark@example.com",
+        "profile_picture": "https://test.backendserviceforumapi.online/uploads/default.jpg",
+        "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit.",
+        "created_at": datetime(2024, 12, 2, 16, 37, 48, 692238),
+        "provisional_id": None,
+    }
+
+
+def message() -> dict:
+    return {
+        "id": 987654,
+        "conversation_id": 4321,
+        "created_at": datetime(2024, 12, 2, 16, 37, 48, 692238),
+        "user_id": 1234,
+        "content": "See the attached pictures.",
+        "username": "benchmark",
+        "profile_picture": "https://test.backendserviceforumapi.online/uploads/default.jpg",
+        "files": [
+            f"https://test.backendserviceforumapi.online/uploads/{i}_photo.jpg"
+            for i in range(3)
+        ],
+    }
+
+
+def post_page() -> dict:
+    return {
+        "items": [
+            {
+                "id": 1000 + i,
+                "topic": "Benchmark topic",
+                "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit.",
+                "tags": ["python", "fastapi"],
+                "created_at": datetime(2024, 12, 2, 16, 37, 48, 692238),
+                "user": {
+                    "id": 1234,
+                    "username": "benchmark",
+                    "email": "benchmark@example.com",
+                    "profile_picture": "https://test.backendserviceforumapi.online/uploads/default.jpg",
+                },
+                "likes_count": i,
+                "comments_count": i * 2,
+                "is_liked": bool(i % 2),
+                "files": [
+                    {"id": i, "link": f"uploads/{i}_photo.jpg", "post_id": 1000 + i}
+                ],
+            }
+            for i in range(50)
+        ],
+        "total": 50,
+        "page": 1,
+        "size": 50,
+        "pages": 1,
+    }
+
+
+def per_call(function, argument, rounds: int) -> float:
+    with Timer() as timer:
+        for _ in range(rounds):
+            function(argument)
+    return timer.elapsed / rounds * 1e6
+
+
+def main():
+    warnings.simplefilter("ignore")
+    print("bytes and microseconds per call")
+    print(
+        f"{'payload':>8} {'json B':>7} {'msgpack B':>10} {'saved':>6}"
+        f" {'json enc':>9} {'mp enc':>7} {'json dec':>9} {'mp dec':>7}"
+        f" {'transcode':>10}"
+    )
+    for name, data, rounds in (
+        ("comment", comment(), ROUNDS),
+        ("message", message(), ROUNDS),
+        ("posts", post_page(), ROUNDS // 50),
+    ):
+        as_json, as_msgpack = dumps(data), packb(data)
+        print(
+            f"{name:>8} {len(as_json):>7} {len(as_msgpack):>10}"
+            f" {1 - len(as_msgpack) / len(as_json):>6.0%}"
+            f" {per_call(dumps, data, rounds):>9.2f}"
+            f" {per_call(packb, data, rounds):>7.2f}"
+            f" {per_call(orjson.loads, as_json, rounds):>9.2f}"
+            f" {per_call(unpackb, as_msgpack, rounds):>7.2f}"
+            f" {per_call(json_to_msgpack, as_json, rounds):>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
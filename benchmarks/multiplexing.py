@@ -0,0 +1,69 @@
+"""
+Per-user server resources for a client following many channels: one socket
+per chat or post (the legacy endpoints) against one multiplexed /ws socket.
+
+Only the manager's side is measured, every socket also costs a handler task,
+a TLS session and a DB session at the handshake on top of this.
+
+    python -m benchmarks.multiplexing
+"""
+
+import asyncio
+import tracemalloc
+
+from benchmarks.common import NullWebSocket, SendCounter
+from websocket_package.brokers import InMemoryBroker
+from websocket_package.manager import ConnectionManager
+
+USERS = 100
+CHANNEL_COUNTS = (1, 10, 50)
+
+
+async def measure(channels: int, multiplexed: bool) -> tuple[int, int, int]:
+    manager = ConnectionManager(broker=InMemoryBroker())
+    await manager.start()
+    counter = SendCounter()
+    tasks_before = len(asyncio.all_tasks())
+
+    tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot()
+    for _ in range(USERS):
+        if multiplexed:
+            connection = await manager.connect(
+                NullWebSocket(counter=counter), multiplexed=True
+            )
+            for channel in range(channels):
+                await manager.join(connection, channel, "chat")
+        else:
+            for channel in range(channels):
+                await manager.connect(NullWebSocket(counter=counter), channel, "chat")
+    allocated = sum(
+        stat.size_diff
+        for stat in tracemalloc.take_snapshot().compare_to(snapshot, "filename")
+    )
+    tracemalloc.stop()
+
+    sockets = len(manager.connections)
+    tasks = len(asyncio.all_tasks()) - tasks_before
+    await manager.stop()
+    return sockets, tasks, allocated
+
+
+async def main():
+    print(f"{USERS} users, resources per user")
+    print(
+        f"{'channels':>8} {'sockets':>8} {'tasks':>6} {'KiB':>8}"
+        f"  {'/ws sockets':>11} {'tasks':>6} {'KiB':>8}"
+    )
+    for channels in CHANNEL_COUNTS:
+        legacy = await measure(channels, multiplexed=False)
+        multiplexed = await measure(channels, multiplexed=True)
+        print(
+            f"{channels:>8} {legacy[0] / USERS:>8.0f} {legacy[1] / USERS:>6.0f} "
+            f"{legacy[2] / USERS / 1024:>8.1f}  {multiplexed[0] / USERS:>11.0f} "
+            f"{multiplexed[1] / USERS:>6.0f} {multiplexed[2] / USERS / 1024:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
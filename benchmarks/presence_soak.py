@@ -0,0 +1,123 @@
+"""
+10k users in 5k two-person chats toggling typing: every round a share of the
+users type a burst of keystroke frames, half of them then send "stopped
+typing" and the others let it expire. The tracker only broadcasts when a
+typing state flips, a relay would forward every frame to the peer.
+Reports the CPU per keystroke frame, the frames that reached the sockets,
+the tracker's memory and what the last_seen flush writes.
+
+No database is needed, the session below only counts the rows it is given.
+
+    python -m benchmarks.presence_soak
+"""
+
+import asyncio
+import random
+import tracemalloc
+from types import SimpleNamespace
+
+from benchmarks.common import NullWebSocket, SendCounter, Timer
+from chat import presence as presence_module
+from chat.presence import PresenceTracker
+from websocket_package.brokers import InMemoryBroker
+from websocket_package.manager import ConnectionManager
+
+USERS = 10_000
+ROUNDS = 10
+# Share of the users typing in a round, and the frames each of them sends.
+TYPING_RATIO = 0.3
+KEYSTROKES_PER_BURST = 8
+
+
+class CountingSession:
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def execute(self, statement, rows):
+        self.statements += 1
+        self.rows += len(rows)
+
+    async def commit(self):
+        pass
+
+
+async def run():
+    presence_module.TYPING_TTL_SECONDS = 0.05
+    counter = SendCounter()
+    session = CountingSession()
+    manager = ConnectionManager(broker=InMemoryBroker())
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    manager.presence = PresenceTracker(session, manager.broadcast)
+    await manager.start()
+    for user_id in range(USERS):
+        await manager.connect(
+            NullWebSocket(counter=counter),
+            user_id // 2,
+            "chat",
+            user=SimpleNamespace(id=user_id),
+        )
+    tracker = manager.presence
+    counter.expect(USERS // 2)
+    await counter.done.wait()
+
+    rng = random.Random(1)
+    keystrokes = 0
+    events = []
+
+    async def broadcast(message, group_id, group_type):
+        events.append(group_id)
+        await manager.broadcast(message, group_id, group_type)
+
+    tracker.broadcast = broadcast
+    with Timer() as timer:
+        for _ in range(ROUNDS):
+            typists = rng.sample(range(USERS), int(USERS * TYPING_RATIO))
+            # Started and stopped, each seen by both members of the chat.
+            counter.expect(4 * len(typists))
+            for _ in range(KEYSTROKES_PER_BURST):
+                for user_id in typists:
+                    await tracker.set_typing(user_id, user_id // 2, True)
+            for user_id in typists[::2]:
+                await tracker.set_typing(user_id, user_id // 2, False)
+            await asyncio.sleep(presence_module.TYPING_TTL_SECONDS)
+            await tracker.expire_typing()
+            await counter.done.wait()
+            keystrokes += len(typists) * (KEYSTROKES_PER_BURST + 0.5)
+
+    # Only the tracker's state, the sockets are excluded.
+    after = tracemalloc.take_snapshot()
+    tracker_bytes = sum(
+        stat.size_diff
+        for stat in after.compare_to(before, "filename")
+        if stat.traceback[0].filename == presence_module.__file__
+    )
+    tracemalloc.stop()
+    await tracker.flush()
+    await manager.stop()
+
+    # Delivery to the sockets included, the sleeps letting typing expire not.
+    busy = timer.elapsed - ROUNDS * presence_module.TYPING_TTL_SECONDS
+    print(f"{USERS} users, {keystrokes:.0f} typing frames received")
+    print(f"time per typing frame:        {busy / keystrokes * 1e6:.2f} us")
+    print(f"typing events broadcast:      {len(events)} (relayed: {keystrokes:.0f})")
+    print(f"events per frame received:    {len(events) / keystrokes:.3f}")
+    print(f"tracker memory:               {tracker_bytes / 1024:.0f} KiB")
+    print(
+        f"last_seen flush:              {session.statements} statement,"
+        f" {session.rows} rows"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
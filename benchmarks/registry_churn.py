@@ -0,0 +1,60 @@
+"""
+Connect and disconnect churn in one big room. The old registry kept each
+room as a list, so every disconnect was a list.remove() scan; it is timed
+on a sample of removals because a full run at 100k would take minutes.
+
+    python -m benchmarks.registry_churn
+"""
+
+import asyncio
+import random
+from types import SimpleNamespace
+
+from benchmarks.common import NullWebSocket, SendCounter, Timer
+from websocket_package.brokers import InMemoryBroker
+from websocket_package.manager import ConnectionManager
+
+ROOM_SIZES = (10_000, 100_000)
+LEGACY_SAMPLE = 1000
+
+
+def legacy_disconnect(room_size: int) -> float:
+    room = [object() for _ in range(room_size)]
+    leaving = random.sample(room, LEGACY_SAMPLE)
+    with Timer() as timer:
+        for connection in leaving:
+            room.remove(connection)
+    return timer.elapsed / LEGACY_SAMPLE
+
+
+async def churn(room_size: int) -> tuple[float, float]:
+    manager = ConnectionManager(broker=InMemoryBroker())
+    await manager.start()
+    counter = SendCounter()
+    sockets = [NullWebSocket(counter=counter) for _ in range(room_size)]
+
+    with Timer() as connecting:
+        for i, socket in enumerate(sockets):
+            await manager.connect(socket, 1, "chat", user=SimpleNamespace(id=i))
+    random.shuffle(sockets)
+    with Timer() as disconnecting:
+        for socket in sockets:
+            await manager.disconnect(socket, 1, "chat")
+    await manager.stop()
+    return connecting.elapsed / room_size, disconnecting.elapsed / room_size
+
+
+async def main():
+    print("microseconds per operation")
+    print(f"{'room':>8} {'connect':>9} {'disconnect':>11} {'list.remove':>12}")
+    for room_size in ROOM_SIZES:
+        connect, disconnect = await churn(room_size)
+        legacy = legacy_disconnect(room_size)
+        print(
+            f"{room_size:>8} {connect * 1e6:>9.2f} {disconnect * 1e6:>11.2f} "
+            f"{legacy * 1e6:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""
+Bandwidth against CPU for ?compress=deflate: the frames a /ws/chats socket
+(a chat message) and a /ws/posts socket (a comment) receive, plus a chat
+message with a long text, at several zlib levels.
+
+A frame is compressed once per broadcast, whatever the size of the room, the
+"compress" column is that cost. "inflate" is what each client pays.
+
+    python -m benchmarks.ws_compression
+"""
+
+import zlib
+
+from benchmarks.msgpack_codec import comment, message, per_call
+from websocket_package.serialization import dumps, json_to_msgpack
+
+ROUNDS = 20_000
+LEVELS = (1, 6, 9)
+
+
+def long_message() -> dict:
+    data = message()
+    data["content"] = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20
+    return data
+
+
+def main():
+    print("bytes and microseconds per frame")
+    print(
+        f"{'endpoint':>10} {'codec':>8} {'level':>5} {'raw B':>6} {'sent B':>7}"
+        f" {'saved':>6} {'compress':>9} {'inflate':>8}"
+    )
+    for endpoint, data in (
+        ("/ws/chats", message()),
+        ("/ws/chats", long_message()),
+        ("/ws/posts", comment()),
+    ):
+        as_json = dumps(data)
+        for codec, raw in (("json", as_json), ("msgpack", json_to_msgpack(as_json))):
+            for level in LEVELS:
+                compressed = zlib.compress(raw, level)
+                print(
+                    f"{endpoint:>10} {codec:>8} {level:>5} {len(raw):>6}"
+                    f" {len(compressed):>7} {1 - len(compressed) / len(raw):>6.0%}"
+                    f" {per_call(lambda d: zlib.compress(d, level), raw, ROUNDS):>9.2f}"
+                    f" {per_call(zlib.decompress, compressed, ROUNDS):>8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import uuid
+
+import aiofiles
+import orjson
+from fastapi import WebSocket
+
+from websocket_package.frames import is_pong, receive_frame
+
+UPLOAD_DIRECTORY = "uploads"
+MAX_ATTACHMENT_BYTES = int(os.getenv("WS_MAX_ATTACHMENT_BYTES", 10 * 1024 * 1024))
+MAX_ATTACHMENTS_PER_MESSAGE = 10
+
+
+class AttachmentError(Exception):
+    def __init__(self, detail: str, close_code: int = 1003):
+        super().__init__(detail)
+        self.close_code = close_code
+
+
+def validate_attachments(files) -> list[tuple[str, int]]:
+    if not isinstance(files, list) or not files:
+        raise AttachmentError("Attachment frame without files.")
+    if len(files) > MAX_ATTACHMENTS_PER_MESSAGE:
+        raise AttachmentError("Too many attachments.", close_code=1009)
+
+    attachments = []
+    for file in files:
+        name = os.path.basename(str(file.get("name") or ""))
+        size = file.get("size")
+        if not name or not isinstance(size, int) or size <= 0:
+            raise AttachmentError("Every attachment needs a name and a size.")
+        if size > MAX_ATTACHMENT_BYTES:
+            raise AttachmentError("Attachment is too large.", close_code=1009)
+        attachments.append((name, size))
+    return attachments
+
+
+def is_pong_text(frame: str) -> bool:
+    try:
+        return is_pong(orjson.loads(frame))
+    except orjson.JSONDecodeError:
+        return False
+
+
+async def receive_attachments(
+    websocket: WebSocket, files, connection=None
+) -> list[str]:
+    """
+    Stream the binary frames following an attachment frame straight into the
+    upload directory, one file after another, and return the written paths.
+    Only one chunk is held in memory at a time, whatever the file size.
+
+    Not on msgpack sockets: every frame they send is binary, a control frame
+    arriving mid-upload could not be told apart from a chunk.
+    """
+    if connection is not None and connection.msgpack:
+        raise AttachmentError("Attachments are not supported on msgpack sockets.")
+    attachments = validate_attachments(files)
+    written = []
+    try:
+        for name, size in attachments:
+            file_path = f"{UPLOAD_DIRECTORY}/{uuid.uuid4()}_{name}"
+            written.append(file_path)
+            remaining = size
+            async with aiofiles.open(file_path, "wb") as f:
+                while remaining:
+                    chunk = await receive_frame(websocket, connection)
+                    if not isinstance(chunk, bytes):
+                        # The heartbeat goes on during a long upload,
+                        # receive_frame() already counted the pong.
+                        if is_pong_text(chunk):
+                            continue
+                        raise AttachmentError("Expected a binary attachment chunk.")
+                    if len(chunk) > remaining:
+                        raise AttachmentError(
+                            "Attachment is larger than announced.", close_code=1009
+                        )
+                    await f.write(chunk)
+                    remaining -= len(chunk)
+    except BaseException:
+        for file_path in written:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        raise
+    return written
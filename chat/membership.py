@@ -0,0 +1,39 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from db import models
+
+
+class ConversationMembershipCache:
+    """
+    Member ids of the conversations that have open sockets on this worker.
+    Looked up once when the first socket joins and shared by the rest, so
+    the chat socket does not query membership for every message.
+    """
+
+    def __init__(self):
+        self.members: dict[int, frozenset[int]] = {}
+
+    async def get_members(self, db: AsyncSession, conversation_id: int):
+        members = self.members.get(conversation_id)
+        if members is None:
+            result = await db.execute(
+                select(models.DBConversationMember.user_id).filter(
+                    models.DBConversationMember.conversation_id == conversation_id
+                )
+            )
+            members = frozenset(result.scalars().all())
+            if members:
+                self.members[conversation_id] = members
+        return members
+
+    def invalidate(self, conversation_id: int):
+        self.members.pop(conversation_id, None)
+
+    def invalidate_user(self, user_id: int):
+        for conversation_id, members in list(self.members.items()):
+            if user_id in members:
+                del self.members[conversation_id]
+
+
+membership_cache = ConversationMembershipCache()
@@ -0,0 +1,225 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import update
+
+from db import models
+from db.engine import async_session
+from websocket_package.manager import manager
+from websocket_package.serialization import dumps
+
+# Typing stops on its own once the client has not refreshed it for this long.
+TYPING_TTL_SECONDS = float(os.getenv("WS_TYPING_TTL_SECONDS", 5))
+# A user who reconnects within the grace period never appears offline.
+OFFLINE_GRACE_SECONDS = float(os.getenv("WS_OFFLINE_GRACE_SECONDS", 5))
+LAST_SEEN_FLUSH_SECONDS = float(os.getenv("WS_LAST_SEEN_FLUSH_SECONDS", 60))
+
+
+def utc_now() -> datetime:
+    # The columns are naive UTC, like the server_default now() of created_at.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class PresenceTracker:
+    """
+    Online and typing state, kept in memory only. The manager reports when a
+    user's first socket opens and their last one closes (ConnectionManager.users)
+    and which chats they join.
+
+    Peers learn about it through the chat groups the user joined:
+    {"type": "presence", "user_id", "online", "last_seen"} and
+    {"type": "typing", "user_id", "conversation_id", "typing"} are broadcast
+    only when the state flips, never for every keystroke or reconnect. The
+    only write is last_seen, for all the users seen since the previous flush,
+    in one statement every LAST_SEEN_FLUSH_SECONDS.
+    """
+
+    def __init__(self, session_factory, broadcast):
+        self.session_factory = session_factory
+        self.broadcast = broadcast
+        # The chats each online user joined, where their presence is announced,
+        # and the other way around.
+        self.online: dict[int, set[int]] = {}
+        self.online_in: dict[int, set[int]] = {}
+        # Users whose last socket closed, announced offline once the timer fires.
+        self.leaving: dict[int, asyncio.TimerHandle] = {}
+        # user id -> conversation id -> loop time the typing state expires at.
+        self.typing: dict[int, dict[int, float]] = {}
+        # Users gone offline since the last flush, with the time they left.
+        self.left: dict[int, datetime] = {}
+        self.task: asyncio.Task | None = None
+        self.flushed_count = 0
+
+    def connected(self, user_id: int):
+        handle = self.leaving.pop(user_id, None)
+        if handle is not None:
+            handle.cancel()
+            return
+        self.online.setdefault(user_id, set())
+
+    async def joined(self, user_id: int, conversation_id: int):
+        conversations = self.online.setdefault(user_id, set())
+        if conversation_id in conversations:
+            return
+        conversations.add(conversation_id)
+        self.online_in.setdefault(conversation_id, set()).add(user_id)
+        await self._announce(user_id, conversation_id, online=True)
+
+    def snapshot(self, conversation_id: int, user_id: int) -> dict | None:
+        """
+        Who else is online and typing in the chat, for a socket joining it.
+        None when nobody is, there is nothing to send then.
+        """
+        online = sorted(self.online_in.get(conversation_id, set()) - {user_id})
+        typing = sorted(
+            typing_user_id
+            for typing_user_id, conversations in self.typing.items()
+            if typing_user_id != user_id and conversation_id in conversations
+        )
+        if not online and not typing:
+            return None
+        return {
+            "type": "presence.snapshot",
+            "conversation_id": conversation_id,
+            "online": online,
+            "typing": typing,
+        }
+
+    def disconnected(self, user_id: int):
+        if user_id in self.leaving:
+            return
+        self.leaving[user_id] = asyncio.get_running_loop().call_later(
+            OFFLINE_GRACE_SECONDS,
+            lambda: asyncio.create_task(self._go_offline(user_id)),
+        )
+
+    async def set_typing(self, user_id: int, conversation_id: int, typing: bool):
+        conversations = self.typing.setdefault(user_id, {})
+        if typing:
+            started = conversation_id not in conversations
+            conversations[conversation_id] = (
+                asyncio.get_running_loop().time() + TYPING_TTL_SECONDS
+            )
+            if started:
+                await self._broadcast_typing(user_id, conversation_id, True)
+        elif conversations.pop(conversation_id, None) is not None:
+            await self._broadcast_typing(user_id, conversation_id, False)
+        if not conversations:
+            del self.typing[user_id]
+
+    async def expire_typing(self):
+        now = asyncio.get_running_loop().time()
+        for user_id, conversations in list(self.typing.items()):
+            for conversation_id, expires_at in list(conversations.items()):
+                if expires_at <= now:
+                    await self.set_typing(user_id, conversation_id, False)
+
+    async def flush(self):
+        """Write last_seen for the users online now and those who left."""
+        now = utc_now()
+        left, self.left = self.left, {}
+        last_seen = {user_id: now for user_id in self.online}
+        last_seen.update(left)
+        if not last_seen:
+            return
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(models.DBUser),
+                    [
+                        {"id": user_id, "last_seen": seen}
+                        for user_id, seen in last_seen.items()
+                    ],
+                )
+                await db.commit()
+        except Exception:
+            # Retried with the next flush, unless they left again meanwhile.
+            self.left = {**left, **self.left}
+            raise
+        self.flushed_count += len(last_seen)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for user_id, handle in list(self.leaving.items()):
+            handle.cancel()
+            self.left[user_id] = utc_now()
+            for conversation_id in self.online.pop(user_id, ()):
+                self._forget(user_id, conversation_id)
+        self.leaving.clear()
+        self.typing.clear()
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"last_seen flush error: {e}")
+
+    async def _go_offline(self, user_id: int):
+        if self.leaving.pop(user_id, None) is None:
+            return
+        for conversation_id in list(self.typing.get(user_id, ())):
+            await self.set_typing(user_id, conversation_id, False)
+        self.left[user_id] = utc_now()
+        for conversation_id in self.online.pop(user_id, ()):
+            self._forget(user_id, conversation_id)
+            await self._announce(user_id, conversation_id, online=False)
+
+    def _forget(self, user_id: int, conversation_id: int):
+        users = self.online_in.get(conversation_id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self.online_in[conversation_id]
+
+    async def _announce(self, user_id: int, conversation_id: int, online: bool):
+        await self.broadcast(
+            dumps(
+                {
+                    "type": "presence",
+                    "user_id": user_id,
+                    "online": online,
+                    "last_seen": None if online else self.left.get(user_id),
+                }
+            ),
+            conversation_id,
+            "chat",
+        )
+
+    async def _broadcast_typing(self, user_id: int, conversation_id: int, typing: bool):
+        await self.broadcast(
+            dumps(
+                {
+                    "type": "typing",
+                    "user_id": user_id,
+                    "conversation_id": conversation_id,
+                    "typing": typing,
+                }
+            ),
+            conversation_id,
+            "chat",
+        )
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_flush = loop.time() + LAST_SEEN_FLUSH_SECONDS
+        while True:
+            await asyncio.sleep(min(1.0, TYPING_TTL_SECONDS))
+            try:
+                await self.expire_typing()
+                if loop.time() >= next_flush:
+                    next_flush = loop.time() + LAST_SEEN_FLUSH_SECONDS
+                    await self.flush()
+            except Exception as e:
+                print(f"Presence error: {e}")
+
+
+presence = PresenceTracker(async_session, manager.broadcast)
@@ -0,0 +1,128 @@
+import asyncio
+import os
+
+from sqlalchemy import bindparam, func, or_, select, update
+
+from db import models
+from db.engine import async_session
+
+# Read acks are coalesced, a member's cursor is written at most this often.
+READ_CURSOR_FLUSH_SECONDS = float(os.getenv("WS_READ_CURSOR_FLUSH_SECONDS", 2))
+
+members = models.DBConversationMember.__table__
+messages = models.DBMessage.__table__
+newest = messages.alias("newest")
+
+# Past the newest message of the conversation a cursor would hide the next ones.
+cursor = func.least(
+    bindparam("cursor"),
+    func.coalesce(
+        select(func.max(newest.c.id))
+        .where(newest.c.conversation_id == members.c.conversation_id)
+        .correlate(members)
+        .scalar_subquery(),
+        0,
+    ),
+)
+
+# Only the messages after the new cursor are counted, a range scan of
+# idx_message_conversation_id that is empty when the whole chat was read.
+advance_cursor = (
+    update(members)
+    .where(members.c.user_id == bindparam("member_user_id"))
+    .where(members.c.conversation_id == bindparam("member_conversation_id"))
+    .where(
+        or_(
+            members.c.last_read_message_id.is_(None),
+            members.c.last_read_message_id < cursor,
+        )
+    )
+    .values(
+        last_read_message_id=cursor,
+        unread_count=select(func.count())
+        .where(messages.c.conversation_id == members.c.conversation_id)
+        .where(messages.c.id > cursor)
+        .where(messages.c.sender_id != members.c.user_id)
+        .correlate(members)
+        .scalar_subquery(),
+    )
+)
+
+
+class ReadCursorWriter:
+    """
+    Each member's last read message, acknowledged by a {"type": "read"} frame
+    or POST /chats/{chat_id}/read. Only the highest message id acknowledged
+    per member is kept, and every READ_CURSOR_FLUSH_SECONDS the cursors that
+    moved are written in one statement, which also recounts those members'
+    unread_count. New messages bump unread_count as they are saved.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        # (user id, conversation id) -> last read message id, not written yet.
+        self.pending: dict[tuple[int, int], int] = {}
+        self.task: asyncio.Task | None = None
+        self.flushed_count = 0
+
+    def read(self, user_id: int, conversation_id: int, message_id: int):
+        key = (user_id, conversation_id)
+        if message_id > self.pending.get(key, 0):
+            self.pending[key] = message_id
+
+    def pending_cursor(self, user_id: int, conversation_id: int) -> int | None:
+        return self.pending.get((user_id, conversation_id))
+
+    async def flush(self):
+        batch, self.pending = self.pending, {}
+        if not batch:
+            return
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    advance_cursor,
+                    [
+                        {
+                            "member_user_id": user_id,
+                            "member_conversation_id": conversation_id,
+                            "cursor": message_id,
+                        }
+                        for (user_id, conversation_id), message_id in batch.items()
+                    ],
+                )
+                await db.commit()
+        except Exception:
+            # Retried with the next flush, along with any newer acks.
+            for (user_id, conversation_id), message_id in batch.items():
+                self.read(user_id, conversation_id, message_id)
+            raise
+        self.flushed_count += len(batch)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write the cursors still pending, nothing is lost on a clean shutdown."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Read cursor flush error: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(READ_CURSOR_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Read cursor flush error: {e}")
+
+
+read_cursors = ReadCursorWriter(async_session)
@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from chat import views
 from chat import serializers
 from dependencies import get_db
+from websocket_package.serialization import accepts_msgpack, msgpack_response
 
 router = APIRouter()
 
@@ -20,11 +21,14 @@ async def get_all_messages(
     response: Response,
     db: AsyncSession = Depends(get_db),
 ) -> Page[serializers.MessagesList]:
-    return paginate(
+    page = paginate(
         await views.get_chat_history(
             user_id=user_id, request=request, response=response, db=db
         )
     )
+    if accepts_msgpack(request, response):
+        return msgpack_response(page, response)
+    return page
 
 
 @router.get(
@@ -39,6 +43,26 @@ async def get_all_chats(
     )
 
 
+@router.post(
+    "/chats/{chat_id}/read",
+    # dependencies=[Depends(RateLimiter(times=120, seconds=60))],
+)
+async def mark_chat_read(
+    chat_id: int,
+    message_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    return await views.mark_chat_read(
+        chat_id=chat_id,
+        message_id=message_id,
+        request=request,
+        response=response,
+        db=db,
+    )
+
+
 @router.delete(
     "/chats/{chat_id}",
     # dependencies=[Depends(RateLimiter(times=120, seconds=60))],
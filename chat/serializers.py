@@ -88,6 +88,8 @@ class ChatList(BaseModel):
     username: str
     profile_picture: str
     last_message: str | None = None
+    last_read_message_id: int | None = None
+    unread_count: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     class Config:
@@ -1,6 +1,6 @@
 import base64
 
-from sqlalchemy import or_
+from sqlalchemy import or_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
@@ -9,8 +9,16 @@ from fastapi.exceptions import HTTPException
 from sqlalchemy.orm import selectinload
 
 from chat import serializers
+from chat.membership import membership_cache
+from chat.read_cursors import read_cursors
 from db import models
 from dependencies import get_current_user, encrypt_message
+from websocket_package.manager import manager
+from websocket_package.notifications import notify, preview
+from websocket_package.serialization import dump_model, dumps
+
+# Messages replayed to a reconnecting socket, a longer gap means a full reload.
+REPLAY_LIMIT = 200
 
 
 async def get_chat_history(
@@ -91,6 +99,7 @@ async def get_all_chats(request: Request, response: Response, db: AsyncSession):
     all_chats = [
         {
             "id": chat.id,
+            **unread_state(chat, current_user_id),
             "user_id": next(
                 member.user.id
                 for member in chat.members
@@ -124,6 +133,42 @@ async def get_all_chats(request: Request, response: Response, db: AsyncSession):
     raise HTTPException(status_code=400, detail="No chats found.")
 
 
+def unread_state(chat: models.DBConversation, user_id: int) -> dict:
+    """
+    The member's stored cursor and unread_count, no messages are counted. An
+    ack not written yet still clears the badge once it covers the newest one.
+    """
+    member = next(member for member in chat.members if member.user_id == user_id)
+    last_read_message_id = member.last_read_message_id
+    unread_count = member.unread_count or 0
+    pending = read_cursors.pending_cursor(user_id, chat.id)
+    if pending is not None and pending > (last_read_message_id or 0):
+        last_read_message_id = pending
+        if chat.messages and pending >= max(message.id for message in chat.messages):
+            unread_count = 0
+    return {"last_read_message_id": last_read_message_id, "unread_count": unread_count}
+
+
+async def mark_chat_read(
+    chat_id: int,
+    message_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession,
+):
+    current_user = await get_current_user(request=request, response=response, db=db)
+    # Not through membership_cache, it only holds chats with local sockets.
+    query = await db.execute(
+        select(models.DBConversationMember.id)
+        .filter(models.DBConversationMember.conversation_id == chat_id)
+        .filter(models.DBConversationMember.user_id == current_user.id)
+    )
+    if query.scalars().first() is None:
+        raise HTTPException(status_code=400, detail="No chats found.")
+    read_cursors.read(current_user.id, chat_id, message_id)
+    return {"message": "Chat has been marked as read."}
+
+
 async def delete_chat(
     chat_id: int, request: Request, response: Response, db: AsyncSession
 ):
@@ -144,6 +189,7 @@ async def delete_chat(
     if found_chat:
         await db.delete(found_chat)
         await db.commit()
+        membership_cache.invalidate(chat_id)
         return {"message": "Chat has been deleted."}
     raise HTTPException(status_code=400, detail="No chats found.")
 
@@ -162,9 +208,6 @@ async def send_message_and_create_chat(
         )
         receiver = query_receiver.scalars().first()
         if receiver:
-            encrypted_message = await encrypt_message(message.content)
-            encoded_data = base64.b64encode(encrypted_message).decode("utf-8")
-
             query = await db.execute(
                 select(models.DBConversation)
                 .join(
@@ -187,37 +230,28 @@ async def send_message_and_create_chat(
             )
 
             if conversation is None:
-                new_conversation = models.DBConversation(name="New Chat")
-                db.add(new_conversation)
+                conversation = models.DBConversation(name="New Chat")
+                db.add(conversation)
                 await db.commit()
-                await db.refresh(new_conversation)
+                await db.refresh(conversation)
 
                 member1 = models.DBConversationMember(
-                    user_id=current_user.id, conversation_id=new_conversation.id
+                    user_id=current_user.id, conversation_id=conversation.id
                 )
                 member2 = models.DBConversationMember(
-                    user_id=user_id, conversation_id=new_conversation.id
+                    user_id=user_id, conversation_id=conversation.id
                 )
                 db.add_all([member1, member2])
                 await db.commit()
 
-                new_message = models.DBMessage(
-                    sender_id=current_user.id,
-                    receiver_id=user_id,
-                    conversation_id=new_conversation.id,
-                    content=encoded_data,
-                )
-            else:
-                new_message = models.DBMessage(
-                    sender_id=current_user.id,
-                    receiver_id=user_id,
-                    conversation_id=conversation.id,
-                    content=encoded_data,
-                )
-
-            db.add(new_message)
-            await db.commit()
-            await db.refresh(new_message)
+            # Same path as the chat socket, an open /ws/chats socket gets it live.
+            new_message = await publish_message(
+                db=db,
+                sender=current_user,
+                conversation_id=conversation.id,
+                receiver_id=user_id,
+                content=message.content,
+            )
 
             query_new_message = await db.execute(
                 select(models.DBMessage)
@@ -251,8 +285,35 @@ async def delete_message_view(
     current_user_message = query.scalars().first()
 
     if current_user_message:
+        conversation_id = current_user_message.conversation_id
         await db.delete(current_user_message)
+        # Still unread by the members whose cursor is before it.
+        await db.execute(
+            update(models.DBConversationMember)
+            .where(models.DBConversationMember.conversation_id == conversation_id)
+            .where(models.DBConversationMember.user_id != current_user.id)
+            .where(
+                or_(
+                    models.DBConversationMember.last_read_message_id.is_(None),
+                    models.DBConversationMember.last_read_message_id < message_id,
+                )
+            )
+            .where(models.DBConversationMember.unread_count > 0)
+            .values(unread_count=models.DBConversationMember.unread_count - 1)
+            .execution_options(synchronize_session=False)
+        )
         await db.commit()
+        await manager.broadcast(
+            dumps(
+                {
+                    "type": "message.deleted",
+                    "id": message_id,
+                    "conversation_id": conversation_id,
+                }
+            ),
+            conversation_id,
+            "chat",
+        )
         return {"message": "Message has been deleted."}
     raise HTTPException(status_code=400, detail="No messages found.")
 
@@ -289,5 +350,145 @@ async def edit_message_view(
         current_user_message.content = encoded_data
         await db.commit()
         await db.refresh(current_user_message)
+        await manager.broadcast(
+            dumps(
+                {
+                    "type": "message.edited",
+                    "id": message_id,
+                    "conversation_id": current_user_message.conversation_id,
+                    "content": content,
+                }
+            ),
+            current_user_message.conversation_id,
+            "chat",
+        )
         return current_user_message
     raise HTTPException(status_code=400, detail="Message not found.")
+
+
+async def save_message(
+    db: AsyncSession,
+    sender: models.DBUser,
+    conversation_id: int,
+    receiver_id: int,
+    content: str,
+    file_paths: list[str] = (),
+) -> serializers.MessageCreate:
+    encrypted_data = await encrypt_message(content)
+    encoded_data = base64.b64encode(encrypted_data).decode("utf-8")
+
+    message = models.DBMessage(
+        sender_id=sender.id,
+        receiver_id=receiver_id,
+        conversation_id=conversation_id,
+        content=encoded_data,
+    )
+    db.add(message)
+    # Committed with the message, so the badges never need a count.
+    await db.execute(
+        update(models.DBConversationMember)
+        .where(models.DBConversationMember.conversation_id == conversation_id)
+        .where(models.DBConversationMember.user_id != sender.id)
+        .values(unread_count=models.DBConversationMember.unread_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    await db.refresh(message)
+
+    # The files are already complete on disk, their rows are created together.
+    files = []
+    for file_path in file_paths:
+        encrypted_link = await encrypt_message(
+            f"https://test.backendserviceforumapi.online/{file_path}"
+        )
+        new_file = models.DBFileMessage(
+            message_id=message.id,
+            link=base64.b64encode(encrypted_link).decode("utf-8"),
+        )
+        db.add(new_file)
+        files.append(new_file)
+    if files:
+        await db.commit()
+
+    return serializers.MessageCreate(
+        id=message.id,
+        user_id=sender.id,
+        username=sender.username,
+        profile_picture=sender.profile_picture,
+        conversation_id=conversation_id,
+        content=message.content,
+        created_at=message.created_at,
+        files=[file.link for file in files],
+    )
+
+
+async def publish_message(
+    db: AsyncSession,
+    sender: models.DBUser,
+    conversation_id: int,
+    receiver_id: int,
+    content: str,
+    file_paths: list[str] = (),
+) -> serializers.MessageCreate:
+    """
+    Persist a message, then broadcast it to the conversation's sockets and
+    notify the receiver's /ws/me sockets. Every way of sending a message goes
+    through here, REST and socket alike.
+    """
+    message = await save_message(
+        db=db,
+        sender=sender,
+        conversation_id=conversation_id,
+        receiver_id=receiver_id,
+        content=content,
+        file_paths=file_paths,
+    )
+    await manager.broadcast(dump_model(message), conversation_id, "chat")
+    # The sender has read everything up to their own message.
+    read_cursors.read(sender.id, conversation_id, message.id)
+    await notify(
+        receiver_id,
+        {
+            "type": "message.created",
+            "conversation_id": conversation_id,
+            "message_id": message.id,
+            "user_id": sender.id,
+            "username": sender.username,
+            "content": preview(message.content),
+        },
+    )
+    return message
+
+
+async def get_messages_after(
+    db: AsyncSession, conversation_id: int, last_message_id: int
+) -> list[serializers.MessageCreate]:
+    """
+    The messages a reconnecting socket missed, oldest first, at most
+    REPLAY_LIMIT + 1 of them so the caller can tell the replay is partial.
+    A range scan of idx_message_conversation_id.
+    """
+    result = await db.execute(
+        select(models.DBMessage)
+        .options(
+            selectinload(models.DBMessage.sender),
+            selectinload(models.DBMessage.files),
+        )
+        .filter(models.DBMessage.conversation_id == conversation_id)
+        .filter(models.DBMessage.id > last_message_id)
+        .order_by(models.DBMessage.id)
+        .limit(REPLAY_LIMIT + 1)
+    )
+    return [
+        serializers.MessageCreate(
+            id=message.id,
+            user_id=message.sender_id,
+            username=message.sender.username,
+            profile_picture=message.sender.profile_picture,
+            conversation_id=message.conversation_id,
+            content=message.content,
+            created_at=message.created_at,
+            files=[file.link for file in message.files],
+        )
+        for message in result.scalars().all()
+    ]
@@ -30,11 +30,15 @@ class CommentList(BaseModel):
 
 
 class CommentCreate(BaseModel):
+    # None until the row exists, edit and delete events refer to it.
+    id: int | None = None
     user_id: int
     username: str
     email: str
     profile_picture: str
     content: str
+    # Set in write-behind mode until the row exists, see comments.write_behind.
+    provisional_id: str | None = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     class Config:
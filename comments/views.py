@@ -4,8 +4,11 @@ from sqlalchemy.orm import selectinload
 from fastapi import Response, Request
 from fastapi.exceptions import HTTPException
 
+from comments.serializers import CommentCreate
 from db import models
 from dependencies import get_current_user
+from websocket_package.manager import manager
+from websocket_package.serialization import dumps
 
 
 async def get_all_comments_view(db: AsyncSession, post_id: int):
@@ -43,6 +46,11 @@ async def delete_comment(
     if current_comment:
         await db.delete(current_comment)
         await db.commit()
+        await manager.broadcast(
+            dumps({"type": "comment.deleted", "id": comment_id, "post_id": post_id}),
+            post_id,
+            "post",
+        )
         return {"message": "The comment has been deleted."}
     raise HTTPException(status_code=400, detail="An error has been occurred.")
 
@@ -73,5 +81,41 @@ async def patch_comment(
         current_comment.content = content
         await db.commit()
         await db.refresh(current_comment)
+        await manager.broadcast(
+            dumps(
+                {
+                    "type": "comment.edited",
+                    "id": comment_id,
+                    "post_id": post_id,
+                    "content": content,
+                }
+            ),
+            post_id,
+            "post",
+        )
         return current_comment
     raise HTTPException(status_code=400, detail="An error has been occurred.")
+
+
+async def save_comment(
+    db: AsyncSession, user: models.DBUser, post_id: int, content: str
+) -> CommentCreate:
+    comment_serializer = CommentCreate(
+        user_id=user.id,
+        username=user.username,
+        email=user.email,
+        profile_picture=user.profile_picture,
+        post_id=post_id,
+        content=content,
+    )
+
+    new_comment = models.DBComment(
+        user_id=user.id,
+        post_id=post_id,
+        content=content,
+    )
+    db.add(new_comment)
+    await db.commit()
+    await db.refresh(new_comment)
+    comment_serializer.id = new_comment.id
+    return comment_serializer
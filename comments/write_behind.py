@@ -0,0 +1,140 @@
+import asyncio
+import itertools
+import os
+import uuid
+
+from sqlalchemy import insert
+
+from comments.serializers import CommentCreate
+from db import models
+from db.engine import async_session
+from websocket_package.manager import manager
+from websocket_package.serialization import dumps
+
+WRITE_BEHIND_ENABLED = os.getenv("WS_COMMENT_WRITE_BEHIND") == "true"
+FLUSH_INTERVAL_SECONDS = float(os.getenv("WS_COMMENT_FLUSH_INTERVAL_SECONDS", 0.1))
+FLUSH_BATCH_SIZE = int(os.getenv("WS_COMMENT_FLUSH_BATCH_SIZE", 100))
+
+
+class CommentWriter:
+    """
+    Write-behind for socket comments. A comment is broadcast straight away
+    with a provisional id and inserted later, together with every other
+    comment queued in the meantime, in one multi-row INSERT. Once the rows
+    exist a {"type": "comments.persisted", "ids": {provisional: id}} event
+    tells each post's listeners the final ids.
+    """
+
+    def __init__(self, session_factory, broadcast):
+        self.session_factory = session_factory
+        self.broadcast = broadcast
+        self.pending: list[tuple[str, CommentCreate]] = []
+        # Unique across workers without any coordination.
+        self.prefix = uuid.uuid4().hex[:8]
+        self.counter = itertools.count(1)
+        self.full = asyncio.Event()
+        self.flusher: asyncio.Task | None = None
+        self.stopping = False
+        self.flushed_count = 0
+        self.rejected_count = 0
+
+    def start(self):
+        self.stopping = False
+        self.flusher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is still queued, nothing is lost on a clean shutdown."""
+        self.stopping = True
+        self.full.set()
+        if self.flusher is not None:
+            await self.flusher
+            self.flusher = None
+        await self.flush()
+
+    def add(self, user: models.DBUser, post_id: int, content: str) -> CommentCreate:
+        comment = CommentCreate(
+            user_id=user.id,
+            username=user.username,
+            email=user.email,
+            profile_picture=user.profile_picture,
+            post_id=post_id,
+            content=content,
+            provisional_id=f"{self.prefix}-{next(self.counter)}",
+        )
+        self.pending.append((post_id, comment))
+        if len(self.pending) >= FLUSH_BATCH_SIZE:
+            self.full.set()
+        return comment
+
+    async def flush(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            ids = await self._insert(batch)
+        except Exception as e:
+            print(f"Comment batch of {len(batch)} failed, retrying one by one: {e}")
+            ids = []
+            for post_id, comment in batch:
+                try:
+                    ids.extend(await self._insert([(post_id, comment)]))
+                except Exception as e:
+                    print(f"Dropped comment {comment.provisional_id}: {e}")
+                    self.rejected_count += 1
+                    ids.append(None)
+
+        persisted: dict[int, dict] = {}
+        rejected: dict[int, list] = {}
+        for (post_id, comment), comment_id in zip(batch, ids):
+            if comment_id is None:
+                rejected.setdefault(post_id, []).append(comment.provisional_id)
+            else:
+                persisted.setdefault(post_id, {})[comment.provisional_id] = comment_id
+        self.flushed_count += len(batch) - sum(map(len, rejected.values()))
+
+        for post_id, mapping in persisted.items():
+            await self.broadcast(
+                dumps({"type": "comments.persisted", "ids": mapping}), post_id, "post"
+            )
+        for post_id, provisional_ids in rejected.items():
+            await self.broadcast(
+                dumps(
+                    {"type": "comments.rejected", "provisional_ids": provisional_ids}
+                ),
+                post_id,
+                "post",
+            )
+
+    async def _insert(self, batch) -> list[int]:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                insert(models.DBComment).returning(
+                    models.DBComment.id, sort_by_parameter_order=True
+                ),
+                [
+                    {
+                        "user_id": comment.user_id,
+                        "post_id": post_id,
+                        "content": comment.content,
+                    }
+                    for post_id, comment in batch
+                ],
+            )
+            ids = result.scalars().all()
+            await db.commit()
+        return ids
+
+    async def _run(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.full.wait(), FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Comment flush error: {e}")
+
+
+comment_writer = CommentWriter(async_session, manager.broadcast)
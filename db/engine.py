@@ -28,6 +28,11 @@ async_session = sessionmaker(
 )
 
 
+def pool_checked_out() -> int:
+    """Gauge of pooled connections currently held by a session."""
+    return engine.pool.checkedout()
+
+
 async def init_db():
     async with engine.begin() as conn:
         # await conn.run_sync(SQLModel.metadata.drop_all)
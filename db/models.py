@@ -54,6 +54,8 @@ class DBUser(Base):
     bio = Column(String(500), nullable=True)
     role = Column(ENUM(Role), nullable=False, default=Role.user)
     created_at = Column(DateTime, server_default=func.now())
+    # Flushed from memory now and then, see chat.presence.PresenceTracker.
+    last_seen = Column(DateTime, nullable=True)
 
     posts = relationship("DBPost", back_populates="user", cascade="all, delete-orphan")
     post_likes = relationship(
@@ -188,6 +190,10 @@ class DBConversationMember(Base):
         Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False
     )
     joined_at = Column(DateTime, default=func.now())
+    # Advanced by chat.read_cursors, unread_count is kept up to date alongside
+    # so listing the chats never counts messages.
+    last_read_message_id = Column(Integer, nullable=True)
+    unread_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     user = relationship("DBUser", back_populates="conversations")
     conversation = relationship("DBConversation", back_populates="members")
@@ -219,3 +225,8 @@ class DBMessage(Base):
         "DBFileMessage", back_populates="message", cascade="all, delete-orphan"
     )
     conversation = relationship("DBConversation", back_populates="messages")
+
+    __table_args__ = (
+        # Replaying a chat from a message id, see chat.views.get_messages_after().
+        Index("idx_message_conversation_id", "conversation_id", "id"),
+    )
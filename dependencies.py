@@ -42,6 +42,12 @@ async def create_refresh_token(data: dict):
     return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def decode_access_token(access_token: str) -> dict:
+    return jwt.decode(
+        access_token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")]
+    )
+
+
 async def refresh_token_view(refresh_token: str):
     try:
         payload = jwt.decode(
@@ -1,18 +1,16 @@
-import base64
-import os
-import re
+import time
 import uuid
 
 import aiofiles
-import aiohttp
 import jwt
+import orjson
 import redis.asyncio as redis
 from fastapi import (
     FastAPI,
     WebSocket,
     WebSocketDisconnect,
-    Depends,
 )
+from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 
@@ -23,18 +21,35 @@ from fastapi.exceptions import HTTPException
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
-from chat.serializers import MessageCreate
+from chat.attachments import AttachmentError, receive_attachments
+from chat.membership import membership_cache
+from chat.presence import presence
+from chat.read_cursors import read_cursors
+from chat.views import REPLAY_LIMIT, get_messages_after, publish_message
 from db import models
-from db.engine import init_db
-from dependencies import get_db
+from db.engine import async_session, init_db
+from dependencies import decode_access_token, refresh_token_view
+from posts.owners import post_owners
 from users.routes import router as users_router
 from posts.routes import router as posts_router
 from chat.routes import router as chat_router
 from comments.routes import router as comment_router
-from comments.serializers import CommentCreate
-from dependencies import encrypt_message
+from websocket_package.routes import router as websocket_router
+from comments.views import save_comment
+from comments.write_behind import WRITE_BEHIND_ENABLED, comment_writer
+from websocket_package.frames import is_pong, receive_message
+from websocket_package.manager import (
+    SERVICE_RESTART_CLOSE_CODE,
+    Connection,
+    Frame,
+    channel_name,
+    manager,
+    parse_channel,
+)
+from websocket_package.notifications import notify, preview
+from websocket_package.rate_limit import THROTTLE_CLOSE_CODE, frame_limiter
+from websocket_package.serialization import dump_model, dumps
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
@@ -63,6 +78,7 @@ app.include_router(users_router, prefix="/api", tags=["users"])
 app.include_router(posts_router, prefix="/api", tags=["posts"])
 app.include_router(chat_router, prefix="/api", tags=["chat"])
 app.include_router(comment_router, prefix="/api", tags=["comments"])
+app.include_router(websocket_router, prefix="/api", tags=["metrics"])
 
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
@@ -74,296 +90,609 @@ async def on_startup():
     #     "redis://redis", encoding="utf-8", decode_responses=True
     # )
     # await FastAPILimiter.init(redis_connection)
+    manager.presence = presence
+    await manager.start()
+    presence.start()
+    read_cursors.start()
+    if WRITE_BEHIND_ENABLED:
+        comment_writer.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await comment_writer.stop()
+    await manager.stop()
+    # After the manager, the sockets it closed count as having left now.
+    await presence.stop()
+    await read_cursors.stop()
+
+
+async def refresh_websocket_token(websocket: WebSocket) -> str | None:
+    """
+    Mint a new access token from the socket's refresh cookie, in process.
+    Returns the new access token, or None when the user has to log in again.
+    """
+    refresh_token = websocket.cookies.get("refresh_token")
+    if refresh_token is None:
+        return None
+    try:
+        access_token, _ = await refresh_token_view(refresh_token)
+    except HTTPException:
+        return None
+    websocket.cookies["access_token"] = access_token
+    return access_token
+
+
+def push_access_token(connection: Connection, access_token: str):
+    """The socket cannot set cookies, the client stores the token itself."""
+    manager.send(
+        connection,
+        dumps(
+            {
+                "type": "token",
+                "access_token": access_token,
+                "expires_at": connection.token_expires_at,
+            }
+        ),
+    )
+
+
+async def authenticate_websocket(websocket: WebSocket, db: AsyncSession):
+    """
+    Resolve the user once, during the handshake. Returns the user, the exp
+    claim of the access token and the refreshed access token if the one in
+    the cookie had expired, or None if the socket has to be refused.
+    """
+    access_token = websocket.cookies.get("access_token")
+    if access_token is None:
+        return None
+
+    refreshed_token = None
+    try:
+        try:
+            user_data = decode_access_token(access_token)
+        except jwt.ExpiredSignatureError:
+            refreshed_token = await refresh_websocket_token(websocket)
+            if refreshed_token is None:
+                return None
+            user_data = decode_access_token(refreshed_token)
+    except jwt.PyJWTError:
+        return None
+
+    current_user_payload = await db.execute(
+        select(models.DBUser).filter(models.DBUser.email == user_data.get("sub"))
+    )
+    current_user = current_user_payload.scalars().first()
+    if current_user is None:
+        return None
+    return current_user, user_data["exp"], refreshed_token
+
+
+async def open_socket(
+    websocket: WebSocket,
+    group_name: int = None,
+    group_type: str = None,
+    multiplexed: bool = False,
+    admit=None,
+) -> tuple[models.DBUser, Connection] | None:
+    """
+    The handshake every socket endpoint shares: refused while the worker
+    drains or when the user cannot be authenticated, otherwise connected to
+    the group and sent the refreshed access token, if any. "user" groups are
+    the user's own. ``admit(db, user)`` may refuse the socket as well, it is
+    awaited in the handshake's session. Returns None once the socket is closed.
+    """
+    if manager.draining:
+        await websocket.close(code=SERVICE_RESTART_CLOSE_CODE)
+        return None
+    # Sessions are opened per frame, an idle socket must not pin a pooled connection.
+    async with async_session() as db:
+        principal = await authenticate_websocket(websocket, db)
+        if principal is not None and admit is not None:
+            if not await admit(db, principal[0]):
+                principal = None
+    if principal is None:
+        await websocket.close()
+        return None
+    current_user, token_expires_at, refreshed_token = principal
+
+    if group_type == "user":
+        group_name = current_user.id
+    connection = await manager.connect(
+        websocket,
+        group_name,
+        group_type,
+        user=current_user,
+        token_expires_at=token_expires_at,
+        multiplexed=multiplexed,
+    )
+    if refreshed_token is not None:
+        push_access_token(connection, refreshed_token)
+    return current_user, connection
+
+
+async def ensure_token_is_fresh(websocket: WebSocket, connection: Connection) -> bool:
+    """Compare with the cached exp claim, refresh only once it has passed."""
+    if time.time() < connection.token_expires_at:
+        return True
+
+    access_token = await refresh_websocket_token(websocket)
+    if access_token is None:
+        return False
+    try:
+        connection.token_expires_at = decode_access_token(access_token)["exp"]
+    except jwt.PyJWTError:
+        return False
+    push_access_token(connection, access_token)
+    return True
+
+
+async def admit_frame(websocket: WebSocket, connection: Connection) -> bool:
+    """
+    False when the frame is over the rate limit and has to be dropped. The
+    client is told when to retry, one that keeps flooding is disconnected.
+    Nothing new is handled once the worker drains: the client is told with a
+    {"type": "draining"} frame, to send it again once it has reconnected
+    after the close frame that follows.
+    """
+    if manager.draining:
+        manager.send(connection, dumps({"type": "draining"}))
+        return False
+    if frame_limiter.allow(connection):
+        return True
+    if not frame_limiter.strike(connection):
+        await websocket.close(code=THROTTLE_CLOSE_CODE)
+        raise WebSocketDisconnect(THROTTLE_CLOSE_CODE)
+    manager.send(
+        connection,
+        dumps(
+            {
+                "type": "throttled",
+                "retry_after": round(frame_limiter.retry_after(connection), 3),
+            }
+        ),
+    )
+    return False
+
+
+async def screen_frame(websocket: WebSocket, connection: Connection, data) -> bool:
+    """
+    The checks every socket handler runs on a frame, always in this order:
+    pongs are skipped, then the rate limit applies, then an expired token is
+    refreshed, so a flood never reaches the refresh. False when the frame is
+    not to be handled, a socket that cannot refresh its token is closed.
+    """
+    if is_pong(data):
+        return False
+    if not await admit_frame(websocket, connection):
+        return False
+    if not await ensure_token_is_fresh(websocket, connection):
+        await websocket.close()
+        raise WebSocketDisconnect(1000)
+    return True
+
+
+async def create_comment(user: models.DBUser, post_id: int, content: str):
+    """
+    Queued for the next batch in write-behind mode, inserted right away
+    otherwise. The post's author is notified either way.
+    """
+    async with async_session() as db:
+        if WRITE_BEHIND_ENABLED:
+            comment = comment_writer.add(user, post_id, content)
+        else:
+            comment = await save_comment(db, user, post_id, content)
+        # Only queries the first time the post is commented on.
+        owner_id = await post_owners.get_owner(db, post_id)
+    if owner_id is not None and owner_id != user.id:
+        await notify(
+            owner_id,
+            {
+                "type": "comment.created",
+                "post_id": post_id,
+                "user_id": user.id,
+                "username": user.username,
+                "content": preview(content),
+            },
+        )
+    return comment
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, dict[int, list[WebSocket]]] = {
-            "chat": {},
-            "post": {},
-        }
-
-    async def connect(self, websocket: WebSocket, group_name: int, group_type: str):
-        await websocket.accept()
-        if group_name not in self.active_connections[group_type]:
-            self.active_connections[group_type][group_name] = []
-        self.active_connections[group_type][group_name].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, group_name: int, group_type: str):
-        self.active_connections[group_type][group_name].remove(websocket)
-        if not self.active_connections[group_type][group_name]:
-            del self.active_connections[group_type][group_name]
-
-    async def broadcast(self, message: str, group_name: int, group_type: str):
-        if group_name in self.active_connections[group_type]:
-            for connection in self.active_connections[group_type][group_name]:
-                try:
-                    await connection.send_text(message)
-                except Exception as e:
-                    print(f"Error sending message to {connection.client}: {e}")
+@app.websocket("/ws/posts/{post_id}")
+async def websocket_comments(websocket: WebSocket, post_id: int):
+    opened = await open_socket(websocket, post_id, "post")
+    if opened is None:
+        return
+    current_user, connection = opened
+    try:
+        while True:
+            try:
+                data = await receive_message(websocket, connection)
+                if isinstance(data, bytes):
+                    await websocket.close(code=1003)
+                    break
+                if not await screen_frame(websocket, connection, data):
+                    continue
 
+                if data:
+                    try:
+                        comment_serializer = await create_comment(
+                            current_user, post_id, data
+                        )
+                    except Exception as e:
+                        print(e)
+                        raise HTTPException(status_code=400, detail=str(e))
 
-manager = ConnectionManager()
+                    await manager.broadcast(
+                        dump_model(comment_serializer), post_id, "post"
+                    )
 
+            except WebSocketDisconnect:
+                # print(f"User {current_user.email} disconnected from post {post_id}.")
+                # await manager.broadcast(f"Client #{current_user.email} left the chat", post_id, "post")
+                break
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await manager.disconnect(websocket, post_id, "post")
+
+
+@app.websocket("/ws/me")
+async def websocket_notifications(websocket: WebSocket):
+    """
+    The user's own events: likes and comments on their posts and messages
+    sent to them, as {"type": "post.liked" | "comment.created" |
+    "message.created", ...} frames. The client only answers pings.
+    """
+    opened = await open_socket(websocket, group_type="user")
+    if opened is None:
+        return
+    current_user, connection = opened
+    try:
+        while True:
+            data = await receive_message(websocket, connection)
+            await screen_frame(websocket, connection, data)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await manager.disconnect(websocket, current_user.id, "user")
 
-async def fetch(url, cookies):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, cookies=cookies) as response:
-            if response.status == 200:
-                return response
-            else:
-                return {"error": f"Failed to fetch data, status: {response.status}"}
 
+@app.websocket("/ws/chats/{chat_id}")
+async def websocket_chat(websocket: WebSocket, chat_id: int):
+    members = frozenset()
+
+    async def is_member(db: AsyncSession, user: models.DBUser) -> bool:
+        nonlocal members
+        members = await membership_cache.get_members(db, chat_id)
+        if user.id in members:
+            return True
+        release_chat(chat_id)
+        return False
+
+    opened = await open_socket(websocket, group_type="chat", admit=is_member)
+    if opened is None:
+        return
+    current_user, connection = opened
+    receiver_id = next(
+        (member_id for member_id in members if member_id != current_user.id), None
+    )
+    try:
+        # Set by a reconnecting client to the newest message it has.
+        last_message_id = websocket.query_params.get("last_message_id", "")
+        if last_message_id.isdigit():
+            await join_chat(connection, chat_id, int(last_message_id))
+        else:
+            await join_chat(connection, chat_id)
+        while True:
+            try:
+                data = await receive_message(websocket, connection)
+
+                if isinstance(data, bytes):
+                    # Binary frames are only valid after an attachment frame.
+                    await websocket.close(code=1003)
+                    break
+                if not await screen_frame(websocket, connection, data):
+                    continue
 
-@app.websocket("/ws/posts/{post_id}")
-async def websocket_comments(
-    websocket: WebSocket, post_id: int, db: AsyncSession = Depends(get_db)
-):
-    await manager.connect(websocket, post_id, "post")
-    while True:
-        try:
-            access_token = websocket.cookies.get("access_token")
-            user_data = jwt.decode(
-                access_token.encode("utf-8"),
-                os.getenv("SECRET_KEY"),
-                algorithms=[os.getenv("ALGORITHM")],
-            )
-            user_email = user_data.get("sub")
-
-            current_user_payload = await db.execute(
-                select(models.DBUser).filter(models.DBUser.email == user_email)
-            )
-            current_user = current_user_payload.scalars().first()
-
-            data = await websocket.receive_json()
-
-            if data:
-                try:
-                    comment_serializer = CommentCreate(
-                        user_id=current_user.id,
-                        username=current_user.username,
-                        email=current_user.email,
-                        profile_picture=current_user.profile_picture,
-                        post_id=post_id,
-                        content=data,
+                if data.get("type") == "typing":
+                    # {"type": "typing", "typing": bool}, while the user types.
+                    await presence.set_typing(
+                        current_user.id, chat_id, bool(data.get("typing"))
                     )
+                    continue
+
+                if data.get("type") == "read":
+                    # {"type": "read", "message_id": int}, the newest one seen.
+                    if is_message_id(data.get("message_id")):
+                        read_cursors.read(current_user.id, chat_id, data["message_id"])
+                    continue
+
+                if data.get("type") == "attachment":
+                    try:
+                        file_paths = await receive_attachments(
+                            websocket, data.get("files"), connection
+                        )
+                    except AttachmentError as e:
+                        print(f"Rejected attachment from {current_user.email}: {e}")
+                        await websocket.close(code=e.close_code)
+                        break
+                    content = data.get("content") or ""
+
+                elif data.get("content") or data.get("files"):
+                    # Legacy upload: whole files as JSON arrays of byte values.
+                    content = data["content"]
+                    file_paths = []
+                    for file_data in data.get("files") or []:
+                        file_name = file_data.get("name")
+                        binary_data = file_data.get("data")
+
+                        if isinstance(binary_data, list):
+                            file_bytes = bytes(binary_data)
+                        else:
+                            file_bytes = (
+                                binary_data  # Assuming this is already in bytes
+                            )
 
-                    new_comment = models.DBComment(
-                        user_id=current_user.id,
-                        post_id=post_id,
-                        content=data,
-                    )
+                        file_path = f"uploads/{uuid.uuid4()}_{file_name}"
+                        async with aiofiles.open(file_path, "wb") as f:
+                            await f.write(file_bytes)
+                        file_paths.append(file_path)
+                else:
+                    continue
 
-                    db.add(new_comment)
-                    await db.commit()
-                    await db.refresh(new_comment)
+                try:
+                    async with async_session() as db:
+                        await publish_message(
+                            db=db,
+                            sender=current_user,
+                            conversation_id=chat_id,
+                            receiver_id=receiver_id,
+                            content=content,
+                            file_paths=file_paths,
+                        )
                 except Exception as e:
                     print(e)
                     raise HTTPException(status_code=400, detail=str(e))
 
-                try:
-                    await manager.broadcast(comment_serializer.json(), post_id, "post")
-                except RuntimeError:
-                    print("Attempted to send message after WebSocket was closed.")
-                except WebSocketDisconnect:
-                    print(
-                        f"Client #{user_email} disconnected during message broadcast."
-                    )
-                    break
-
-        except (jwt.ExpiredSignatureError, jwt.exceptions.ExpiredSignatureError):
-            # Refresh the token logic
-            url = "https://test.backendserviceforumapi.online/api/is-authenticated/"
-            response = await fetch(url, websocket.cookies)
-            set_cookie_header = response.headers.get("Set-Cookie")
-
-            print(set_cookie_header)
-            if set_cookie_header:
-                match = re.search(r"access_token=([^;]+)", set_cookie_header)
-                if match:
-                    access_token_value = match.group(1)
-                    websocket.cookies["access_token"] = access_token_value
-                else:
-                    # await websocket.send_text("Failed to refresh access token. Please log in again.")
-                    await websocket.close()
-                    break
-        except (jwt.DecodeError, jwt.InvalidTokenError):
-            # await websocket.send_text("Invalid token. Please log in again.")
-            await websocket.close()
-            break
-        except WebSocketDisconnect:
-            manager.disconnect(websocket, post_id, "post")
-            # print(f"User {user_email} disconnected from post {post_id}.")
-            # await manager.broadcast(f"Client #{user_email} left the chat", post_id, "post")
-            break
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=str(e))
-
-
-@app.websocket("/ws/chats/{chat_id}")
-async def websocket_chat(
-    websocket: WebSocket,
-    chat_id: int,
-    db: AsyncSession = Depends(get_db),
-):
-    await manager.connect(websocket, chat_id, "chat")
-    user_email = None
-
-    while True:
-        try:
-            access_token = websocket.cookies.get("access_token")
-
-            if access_token is None:
+            except WebSocketDisconnect:
+                print(f"User {current_user.email} disconnected from chat {chat_id}.")
+                break
+            except Exception as e:
+                print(f"Unexpected error: {str(e)}")
                 await websocket.close()
                 break
+    finally:
+        await manager.disconnect(websocket, chat_id, "chat")
+        release_chat(chat_id)
 
-            user_data = jwt.decode(
-                access_token.encode("utf-8"),
-                os.getenv("SECRET_KEY"),
-                algorithms=[os.getenv("ALGORITHM")],
-            )
-            user_email = user_data.get("sub")
-
-            current_user_payload = await db.execute(
-                select(models.DBUser).filter(models.DBUser.email == user_email)
-            )
-            current_user = current_user_payload.scalars().first()
-
-            data = await websocket.receive_json()
-            if data.get("content") or data.get("files"):
-                try:
-                    query_chat_with_current_user = await db.execute(
-                        select(models.DBConversation)
-                        .outerjoin(
-                            models.DBConversationMember,
-                            models.DBConversationMember.conversation_id
-                            == models.DBConversation.id,
-                        )
-                        .options(selectinload(models.DBConversation.members))
-                        .filter(models.DBConversationMember.user_id == current_user.id)
-                        .filter(models.DBConversation.id == chat_id)
-                        .distinct()
-                    )
-                    current_chat = query_chat_with_current_user.scalars().first()
 
-                    query_receiver = await db.execute(
-                        select(models.DBConversationMember)
-                        .outerjoin(
-                            models.DBUser,
-                            models.DBConversationMember.user_id == models.DBUser.id,
-                        )
-                        .options(selectinload(models.DBConversationMember.user))
-                        .filter(models.DBConversationMember.conversation_id == chat_id)
-                        .filter(models.DBUser.id != current_user.id)
-                        .distinct()
-                    )
-                    receiver = query_receiver.scalars().first()
-
-                    encrypted_data = await encrypt_message(data["content"])
-                    encoded_data = base64.b64encode(encrypted_data).decode(
-                        "utf-8"
-                    )  # change it to string
-
-                    message = models.DBMessage(
-                        sender_id=current_user.id,
-                        receiver_id=receiver.user.id,
-                        conversation_id=current_chat.id,
-                        content=encoded_data,
+async def join_chat(
+    connection: Connection, chat_id: int, last_message_id: int | None = None
+):
+    """
+    Join the chat's group. With last_message_id, the missed messages are
+    first sent as one {"type": "replay", "messages": [...], "complete": bool}
+    frame, live messages arriving meanwhile are held back and sent after it.
+    """
+    if last_message_id is None:
+        await manager.join(connection, chat_id, "chat")
+        send_presence(connection, chat_id)
+        return
+
+    manager.hold(connection)
+    replayed_up_to = last_message_id
+    try:
+        await manager.join(connection, chat_id, "chat")
+        async with async_session() as db:
+            messages = await get_messages_after(db, chat_id, last_message_id)
+
+        replay = {
+            "type": "replay",
+            "messages": [message.model_dump() for message in messages[:REPLAY_LIMIT]],
+            # False when the gap is too long, the client reloads the history.
+            "complete": len(messages) <= REPLAY_LIMIT,
+        }
+        if connection.multiplexed:
+            replay["channel"] = channel_name(chat_id, "chat")
+        manager.send(connection, dumps(replay))
+        send_presence(connection, chat_id)
+        if messages:
+            replayed_up_to = messages[:REPLAY_LIMIT][-1].id
+    finally:
+        # Whatever the replay already covered is not sent twice.
+        manager.release(
+            connection,
+            keep=lambda frame: unreplayed(frame, chat_id, replayed_up_to),
+        )
+
+
+def is_message_id(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def send_presence(connection: Connection, chat_id: int):
+    """Who else is online or typing in the chat, if anyone."""
+    snapshot = presence.snapshot(chat_id, connection.user.id)
+    if snapshot is None:
+        return
+    if connection.multiplexed:
+        snapshot["channel"] = channel_name(chat_id, "chat")
+    manager.send(connection, dumps(snapshot))
+
+
+def unreplayed(frame: Frame, chat_id: int, message_id: int) -> Frame | None:
+    """
+    What the replay of the chat up to message_id did not cover of a held
+    frame. Frames of the socket's other channels are kept whole, coalesced
+    array frames are filtered event by event.
+    """
+    if frame.channel != channel_name(chat_id, "chat"):
+        return frame
+    events = orjson.loads(frame.data)
+    if not isinstance(events, list):
+        return frame if is_newer(events, message_id) else None
+    kept = [event for event in events if is_newer(event, message_id)]
+    if len(kept) == len(events):
+        return frame
+    if not kept:
+        return None
+    return Frame(dumps(kept), frame.channel)
+
+
+def is_newer(event, message_id: int) -> bool:
+    """
+    Typed events, e.g. "message.edited", are never covered by a replay,
+    neither is anything without a message id.
+    """
+    if not isinstance(event, dict) or "type" in event:
+        return True
+    event_id = event.get("id")
+    if not isinstance(event_id, int) or isinstance(event_id, bool):
+        return True
+    return event_id > message_id
+
+
+def release_chat(chat_id: int):
+    """Forget the chat's members once its last local socket is gone."""
+    if chat_id not in manager.active_connections["chat"]:
+        membership_cache.invalidate(chat_id)
+
+
+def send_control(connection: Connection, control_type: str, channel: str, **fields):
+    manager.send(
+        connection, dumps({"type": control_type, "channel": channel, **fields})
+    )
+
+
+@app.websocket("/ws")
+async def websocket_multiplexed(websocket: WebSocket):
+    """
+    One socket for every chat and post the client follows. The client sends
+    {"type": "subscribe" | "unsubscribe", "channel": "chat:5"} to join or
+    leave a group and {"type": "publish", "channel": ..., "content": ...} to
+    post into one, events arrive as {"channel": ..., "data": event}.
+    """
+    opened = await open_socket(websocket, multiplexed=True)
+    if opened is None:
+        return
+    current_user, connection = opened
+    # The other member of every chat the socket joined, by chat id.
+    receivers: dict[int, int | None] = {}
+    try:
+        while True:
+            try:
+                data = await receive_message(websocket, connection)
+
+                if isinstance(data, bytes):
+                    # Attachments still go through /ws/chats/{chat_id}.
+                    await websocket.close(code=1003)
+                    break
+                if not await screen_frame(websocket, connection, data):
+                    continue
+                if not isinstance(data, dict):
+                    continue
+
+                channel = data.get("channel")
+                group = parse_channel(channel)
+                if group is None:
+                    send_control(
+                        connection, "error", channel, detail="Unknown channel."
                     )
-
-                    db.add(message)
-                    await db.commit()
-                    await db.refresh(message)
-
-                    array_with_file_links = []
-
-                    file_data_list = data.get("files", None)
-                    if file_data_list:
-                        for file_data in file_data_list:
-                            file_name = file_data.get("name")
-                            binary_data = file_data.get("data")
-
-                            if isinstance(binary_data, list):
-                                file_bytes = bytes(binary_data)
-                            else:
-                                file_bytes = (
-                                    binary_data  # Assuming this is already in bytes
-                                )
-
-                            print(
-                                f"File Name: {file_name}, File Bytes Length: {len(file_bytes)}"
-                            )
-
-                            file_path = f"uploads/{uuid.uuid4()}_{file_name}"
-
-                            async with aiofiles.open(file_path, "wb") as f:
-                                await f.write(file_bytes)
-
-                            encrypted_data = await encrypt_message(
-                                f"https://test.backendserviceforumapi.online/{file_path}"
-                            )
-                            encoded_data = base64.b64encode(encrypted_data).decode(
-                                "utf-8"
+                    continue
+                group_type, group_name = group
+
+                if data.get("type") == "subscribe":
+                    if group_type == "chat":
+                        async with async_session() as db:
+                            members = await membership_cache.get_members(db, group_name)
+                        if current_user.id not in members:
+                            release_chat(group_name)
+                            send_control(
+                                connection,
+                                "error",
+                                channel,
+                                detail="You are not a member of this chat.",
                             )
+                            continue
+                        receivers[group_name] = next(
+                            (
+                                member_id
+                                for member_id in members
+                                if member_id != current_user.id
+                            ),
+                            None,
+                        )
+                        last_message_id = data.get("last_message_id")
+                        if not isinstance(last_message_id, int):
+                            last_message_id = None
+                        await join_chat(connection, group_name, last_message_id)
+                    else:
+                        await manager.join(connection, group_name, group_type)
+                    send_control(connection, "subscribed", channel)
+
+                elif data.get("type") == "unsubscribe":
+                    await manager.leave(connection, group_name, group_type)
+                    if group_type == "chat":
+                        receivers.pop(group_name, None)
+                        release_chat(group_name)
+                    send_control(connection, "unsubscribed", channel)
+
+                elif data.get("type") == "publish":
+                    content = data.get("content")
+                    if (group_type, group_name) not in connection.groups:
+                        send_control(
+                            connection, "error", channel, detail="Not subscribed."
+                        )
+                        continue
+                    if not content:
+                        continue
 
-                            new_file = models.DBFileMessage(
-                                message_id=message.id,
-                                link=encoded_data,
+                    if group_type == "post":
+                        serializer = await create_comment(
+                            current_user, group_name, content
+                        )
+                        await manager.broadcast(
+                            dump_model(serializer), group_name, group_type
+                        )
+                    else:
+                        async with async_session() as db:
+                            await publish_message(
+                                db=db,
+                                sender=current_user,
+                                conversation_id=group_name,
+                                receiver_id=receivers[group_name],
+                                content=content,
                             )
-                            db.add(new_file)
-                            array_with_file_links.append(new_file)
-                            print(f"Successfully wrote file: {file_path}")
-                    await db.commit()
-
-                    message_serializer = MessageCreate(
-                        id=message.id,
-                        user_id=current_user.id,
-                        username=current_user.username,
-                        profile_picture=current_user.profile_picture,
-                        conversation_id=current_chat.id,
-                        content=message.content,
-                        created_at=message.created_at,
-                        files=[file.link for file in array_with_file_links],
-                    )
-
-                except Exception as e:
-                    print(e)
-                    raise HTTPException(status_code=400, detail=str(e))
 
-                try:
-                    await manager.broadcast(message_serializer.json(), chat_id, "chat")
-                except RuntimeError:
-                    print("Attempted to send message after WebSocket was closed.")
-                except WebSocketDisconnect:
-                    print(
-                        f"Client #{user_email} disconnected during message broadcast."
-                    )
-                    break
+                elif data.get("type") == "typing":
+                    if group_type == "chat" and (group_type, group_name) in (
+                        connection.groups
+                    ):
+                        await presence.set_typing(
+                            current_user.id, group_name, bool(data.get("typing"))
+                        )
 
-        except (jwt.ExpiredSignatureError, jwt.exceptions.ExpiredSignatureError):
-            url = "https://test.backendserviceforumapi.online/api/is-authenticated/"
-            response = await fetch(url, websocket.cookies)
-            set_cookie_header = response.headers.get("Set-Cookie")
+                elif data.get("type") == "read":
+                    if (
+                        group_type == "chat"
+                        and (group_type, group_name) in connection.groups
+                        and is_message_id(data.get("message_id"))
+                    ):
+                        read_cursors.read(
+                            current_user.id, group_name, data["message_id"]
+                        )
 
-            if set_cookie_header:
-                match = re.search(r"access_token=([^;]+)", set_cookie_header)
-                if match:
-                    access_token_value = match.group(1)
-                    websocket.cookies["access_token"] = access_token_value
-                else:
-                    await websocket.close()
-                    break
-        except (jwt.DecodeError, jwt.InvalidTokenError):
-            await websocket.close()
-            break
-        except WebSocketDisconnect:
-            manager.disconnect(websocket, chat_id, "chat")
-            print(f"User {user_email} disconnected from chat {chat_id}.")
-            break
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            await websocket.close()
-            break
+            except WebSocketDisconnect:
+                break
+            except Exception as e:
+                print(f"Unexpected error: {str(e)}")
+                await websocket.close()
+                break
+    finally:
+        await manager.disconnect(websocket)
+        for chat_id in receivers:
+            release_chat(chat_id)
 
 
 from celery_package.celery_tasks import print_message
@@ -0,0 +1,34 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from db import models
+
+# Owners of the most recently commented or liked posts kept in memory.
+MAX_CACHED_POSTS = 10_000
+
+
+class PostOwnerCache:
+    """
+    Author id by post id, for notifying the author of likes and comments.
+    A post never changes hands, so an entry is never stale, the oldest ones
+    are dropped once MAX_CACHED_POSTS are cached.
+    """
+
+    def __init__(self):
+        self.owners: dict[int, int] = {}
+
+    async def get_owner(self, db: AsyncSession, post_id: int) -> int | None:
+        owner_id = self.owners.get(post_id)
+        if owner_id is None:
+            result = await db.execute(
+                select(models.DBPost.user_id).filter(models.DBPost.id == post_id)
+            )
+            owner_id = result.scalars().first()
+            if owner_id is not None:
+                if len(self.owners) >= MAX_CACHED_POSTS:
+                    del self.owners[next(iter(self.owners))]
+                self.owners[post_id] = owner_id
+        return owner_id
+
+
+post_owners = PostOwnerCache()
@@ -7,6 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from dependencies import get_db
 from posts import serializers, views
 from fastapi_pagination import Page, paginate
+from websocket_package.serialization import accepts_msgpack, msgpack_response
 
 
 router = APIRouter()
@@ -21,9 +22,12 @@ async def get_all_posts(
     response: Response,
     db: AsyncSession = Depends(get_db),
 ) -> Page[serializers.PostList]:
-    return paginate(
+    page = paginate(
         await views.get_all_posts_view(request=request, response=response, db=db)
     )
+    if accepts_msgpack(request, response):
+        return msgpack_response(page, response)
+    return page
 
 
 @router.get(
@@ -17,6 +17,8 @@ from sqlalchemy.orm import selectinload
 from db import models
 import aiofiles
 from dependencies import get_current_user, get_posts_with_full_info
+from posts.owners import post_owners
+from websocket_package.notifications import notify
 
 load_dotenv()
 
@@ -254,18 +256,15 @@ async def delete_post_view(
 async def like_the_post_view(
     post_id: int, request: Request, response: Response, db: AsyncSession
 ):
-    current_user_id = (
-        await get_current_user(request=request, response=response, db=db)
-    ).id
+    current_user = await get_current_user(request=request, response=response, db=db)
     try:
         new_like = models.DBPostLike(
-            user_id=current_user_id,
+            user_id=current_user.id,
             post_id=post_id,
         )
         db.add(new_like)
         await db.commit()
         await db.refresh(new_like)
-        return new_like
     except IntegrityError:
         await db.rollback()
         raise HTTPException(
@@ -275,6 +274,19 @@ async def like_the_post_view(
         await db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+    owner_id = await post_owners.get_owner(db, post_id)
+    if owner_id is not None and owner_id != current_user.id:
+        await notify(
+            owner_id,
+            {
+                "type": "post.liked",
+                "post_id": post_id,
+                "user_id": current_user.id,
+                "username": current_user.username,
+            },
+        )
+    return new_like
+
 
 async def unlike_the_post_view(
     post_id: int, request: Request, response: Response, db: AsyncSession
@@ -140,6 +140,23 @@ const Chat = () => {
 
                 const newMessage = JSON.parse(e.data)
 
+                // Events carry a type, new messages do not.
+                switch (newMessage.type) {
+                    case undefined:
+                        break;
+                    case "message.edited":
+                        setMessages(prevState => prevState.map(message =>
+                            message.id === newMessage.id ? {...message, content: newMessage.content} : message
+                        ));
+                        return;
+                    case "message.deleted":
+                        setMessages(prevState => prevState.filter(message => message.id !== newMessage.id));
+                        return;
+                    default:
+                        // ping, presence, presence.snapshot, typing: nothing shown for them yet.
+                        return;
+                }
+
                 newMessage.files = newMessage.files.map((file:string, index:number) => ({ link: file, id: index }));
 
                 setMessages(prevState => [...prevState, newMessage]);
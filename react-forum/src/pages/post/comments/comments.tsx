@@ -68,7 +68,12 @@ const Comments: React.FC<PropsType> = (props: PropsType) => {
     useEffect(() => {
         const socket = new WebSocket(`${WS_URL}/ws/posts/${props.id}`);
         socket.onmessage = (e: MessageEvent<string>) => {
-            const comment = JSON.parse(e.data) as CommentType;
+            const data = JSON.parse(e.data);
+            // Events such as {"type": "ping"} are not comments.
+            if (data.type) {
+                return;
+            }
+            const comment = data as CommentType;
             setComments((prevComments) => [...prevComments, comment]);
             props.setPost(prevState => {
                 if (prevState) {
@@ -0,0 +1,47 @@
+"""
+Production entrypoint: ``python server.py``.
+
+uvicorn closes every open socket before the app's shutdown handlers run, so
+the sockets are drained here first, while they can still be written to.
+"""
+
+import os
+
+import uvicorn
+
+from comments.write_behind import comment_writer
+from db.engine import pool_checked_out
+from main import app
+from websocket_package.manager import manager
+
+
+class Server(uvicorn.Server):
+    async def shutdown(self, sockets=None):
+        # Stop accepting connections before the open ones are closed.
+        for server in self.servers:
+            server.close()
+        # Queued comments are flushed while their listeners can still be
+        # told the final ids.
+        await manager.drain(
+            pending_writes=lambda: pool_checked_out() + len(comment_writer.pending)
+        )
+        await super().shutdown(sockets)
+
+
+if __name__ == "__main__":
+    config = uvicorn.Config(
+        app,
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", 8000)),
+        # Transport level compression of every frame, whatever its size. Turn
+        # it off when the clients use ?compress=deflate, which compresses the
+        # large frames only (see websocket_package.manager.COMPRESS_MIN_BYTES).
+        ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "true") == "true",
+        # Protocol level pings, answered by the browser itself: a socket that
+        # misses one is closed, whatever the client sends or not. Only the
+        # websockets implementation supports them, wsproto would ignore them.
+        ws="websockets",
+        ws_ping_interval=float(os.getenv("WS_PING_INTERVAL_SECONDS", 20)),
+        ws_ping_timeout=float(os.getenv("WS_PING_TIMEOUT_SECONDS", 20)),
+    )
+    Server(config).run()
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from db import models
+from dependencies import ALGORITHM, SECRET_KEY, get_db
+from websocket_package.brokers import InMemoryBroker, InMemoryHub
+from websocket_package.manager import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(
+        self,
+        name: str = "client",
+        query_params: dict = None,
+        cookies: dict = None,
+        subprotocols: list[str] = None,
+    ):
+        self.client = name
+        self.scope = {"subprotocols": subprotocols or []}
+        self.subprotocol = None
+        self.query_params = query_params or {}
+        self.cookies = cookies or {}
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.accepted = False
+        self.closed = False
+        self.sent: list[str | bytes] = []
+        self.close_code = None
+        self.close_reason = None
+        self.disconnect_code = 1000
+        # Set to an unset event to simulate a client that stopped reading.
+        self.send_gate: asyncio.Event | None = None
+
+    async def accept(self, subprotocol: str = None):
+        self.accepted = True
+        self.subprotocol = subprotocol
+
+    async def send_text(self, message: str):
+        if self.send_gate is not None:
+            await self.send_gate.wait()
+        self.sent.append(message)
+
+    async def send_bytes(self, message: bytes):
+        if self.send_gate is not None:
+            await self.send_gate.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000, reason: str = None):
+        self.closed = True
+        self.close_code = code
+        self.close_reason = reason
+
+    async def receive_json(self):
+        data = await self.incoming.get()
+        if data is None:
+            raise WebSocketDisconnect()
+        return data
+
+    async def receive(self):
+        data = await self.incoming.get()
+        if data is None:
+            return {"type": "websocket.disconnect", "code": self.disconnect_code}
+        if isinstance(data, bytes):
+            return {"type": "websocket.receive", "bytes": data}
+        return {"type": "websocket.receive", "text": json.dumps(data)}
+
+    def disconnect(self, code: int = 1000):
+        self.disconnect_code = code
+        self.incoming.put_nowait(None)
+
+
+async def flush():
+    """Let the writer tasks drain their queues."""
+    await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def hub():
+    return InMemoryHub()
+
+
+@pytest.fixture
+async def make_manager(hub):
+    managers = []
+
+    async def factory():
+        manager = ConnectionManager(broker=InMemoryBroker(hub))
+        await manager.start()
+        managers.append(manager)
+        return manager
+
+    yield factory
+
+    for manager in managers:
+        await manager.stop()
+
+
+class FakeResult:
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalar(self):
+        return self.first()
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """
+    Stands in for AsyncSession. ``results`` maps a model class to the rows a
+    select() of that model returns, every executed statement is recorded.
+    """
+
+    def __init__(self, results: dict = None):
+        self.results = results or {}
+        self.statements = []
+        self.added = []
+        self.deleted = []
+        self.inserted = []
+        self.updated = []
+        self.opened = 0
+        self.open = 0
+
+    def __call__(self):
+        """Lets the session double as the async_session factory."""
+        return self
+
+    async def __aenter__(self):
+        self.opened += 1
+        self.open += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.open -= 1
+
+    def queries_for(self, model) -> list:
+        return [
+            statement
+            for statement in self.statements
+            if not statement.is_dml
+            and statement.column_descriptions[0]["entity"] is model
+        ]
+
+    async def execute(self, statement, *args, **kwargs):
+        self.statements.append(statement)
+        if statement.is_insert:
+            # Multi-row INSERT ... RETURNING id, one id per parameter set.
+            rows = args[0] if args else [{}]
+            self.inserted.append((statement, rows))
+            first_id = sum(len(rows) for _, rows in self.inserted) - len(rows) + 1
+            return FakeResult(list(range(first_id, first_id + len(rows))))
+        if statement.is_update:
+            self.updated.append((statement, args[0] if args else None))
+            return FakeResult([])
+        entity = statement.column_descriptions[0]["entity"]
+        return FakeResult(self.results.get(entity, []))
+
+    def add(self, instance):
+        self.added.append(instance)
+
+    def add_all(self, instances):
+        self.added.extend(instances)
+
+    async def delete(self, instance):
+        self.deleted.append(instance)
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, instance):
+        # What the database would have filled in.
+        if getattr(instance, "id", None) is None:
+            instance.id = len(self.added)
+        if getattr(instance, "created_at", 1) is None:
+            instance.created_at = datetime.now()
+
+    async def close(self):
+        pass
+
+
+def make_token(email: str, expires_in: timedelta) -> str:
+    return jwt.encode(
+        {"sub": email, "exp": time.time() + expires_in.total_seconds()},
+        SECRET_KEY,
+        algorithm=ALGORITHM,
+    )
+
+
+@pytest.fixture
+def user():
+    return SimpleNamespace(
+        id=1,
+        email="testuser@example.com",
+        username="testuser",
+        profile_picture="https://test.backendserviceforumapi.online/uploads/default.jpg",
+    )
+
+
+@pytest.fixture
+def session(user, monkeypatch):
+    session = FakeSession({models.DBUser: [user]})
+
+    async def override_get_db():
+        yield session
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    monkeypatch.setattr(main, "async_session", session)
+    monkeypatch.setattr(main.presence, "session_factory", session)
+    monkeypatch.setattr(main.read_cursors, "session_factory", session)
+    monkeypatch.setattr(main.read_cursors, "pending", {})
+    yield session
+    main.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def no_database():
+        pass
+
+    monkeypatch.setattr(main, "init_db", no_database)
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from websocket_package.brokers import Broker, RedisBroker
+
+
+class FakePubSub:
+    """Stands in for redis.asyncio's PubSub, fed by FakeRedis.publish()."""
+
+    def __init__(self):
+        self.channels: set[str] = set()
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    @property
+    def subscribed(self) -> bool:
+        return bool(self.channels)
+
+    async def subscribe(self, channel: str):
+        self.channels.add(channel)
+        await self.messages.put(
+            {"type": "subscribe", "channel": channel.encode(), "data": 1}
+        )
+
+    async def unsubscribe(self, channel: str):
+        self.channels.discard(channel)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        # Like redis-py, reading before the first subscribe is an error.
+        if not self.subscribed:
+            raise RuntimeError("pubsub connection not set")
+        try:
+            message = await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if ignore_subscribe_messages and message["type"] == "subscribe":
+            return None
+        return message
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeRedis:
+    def __init__(self, pubsub: FakePubSub):
+        self.pubsub = pubsub
+        self.closed = False
+
+    async def publish(self, channel: str, message: bytes):
+        if channel in self.pubsub.channels:
+            await self.pubsub.messages.put(
+                {"type": "message", "channel": channel.encode(), "data": message}
+            )
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_broker_must_implement_the_transport():
+    with pytest.raises(TypeError):
+        Broker()
+
+
+async def test_redis_broker_delivers_subscribed_channels_without_prefix():
+    broker = RedisBroker("redis://localhost")
+    pubsub = FakePubSub()
+    broker.pubsub, broker.redis = pubsub, FakeRedis(pubsub)
+    received = []
+
+    async def on_message(channel, message):
+        received.append((channel, message))
+
+    await broker.start(on_message)
+    # The listener waits for the first subscribe instead of failing.
+    await asyncio.sleep(0.15)
+    await broker.subscribe("chat:5")
+    await broker.publish("chat:5", b"hello")
+    await broker.publish("post:1", b"nobody listens")
+    await broker.unsubscribe("chat:5")
+    await broker.subscribe("post:1")
+    await broker.publish("post:1", b"comment")
+    await asyncio.sleep(0.3)
+    await broker.stop()
+
+    assert received == [("chat:5", b"hello"), ("post:1", b"comment")]
+    assert pubsub.channels == {"ws:post:1"}
+    assert pubsub.closed and broker.redis.closed
+    assert broker.listener is None
@@ -0,0 +1,81 @@
+import base64
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from db import models
+from dependencies import cipher
+from unit_tests.conftest import make_token
+
+
+@pytest.fixture(autouse=True)
+def login(client, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+
+def test_message_edits_and_deletes_reach_the_chat(client, session, user):
+    session.results[models.DBConversationMember] = [user.id, 2]
+    session.results[models.DBMessage] = [
+        SimpleNamespace(
+            id=4,
+            sender=user,
+            conversation_id=5,
+            content=base64.b64encode(cipher.encrypt(b"typo")).decode(),
+            created_at=datetime(2024, 1, 1),
+            files=[],
+        )
+    ]
+
+    with client.websocket_connect("/ws/chats/5") as websocket:
+        websocket.send_json({"content": "joined"})
+        websocket.receive_json()
+
+        client.patch("/api/chats/4/edit-message", params={"content": "fixed"})
+        assert websocket.receive_json() == {
+            "type": "message.edited",
+            "id": 4,
+            "conversation_id": 5,
+            "content": "fixed",
+        }
+        client.delete("/api/chats/4/delete-message")
+        assert websocket.receive_json() == {
+            "type": "message.deleted",
+            "id": 4,
+            "conversation_id": 5,
+        }
+
+
+def test_comment_edits_and_deletes_reach_the_post(client, session, user):
+    session.results[models.DBComment] = [
+        SimpleNamespace(
+            id=3,
+            user_id=user.id,
+            user=user,
+            post_id=7,
+            content="frist",
+            created_at=datetime(2024, 1, 1),
+        )
+    ]
+
+    with client.websocket_connect("/ws/posts/7") as websocket:
+        websocket.send_json("first")
+        assert websocket.receive_json()["content"] == "first"
+
+        response = client.patch(
+            "/api/posts/7/all-comments/3", params={"content": "first!"}
+        )
+        assert response.json()["content"] == "first!"
+        assert websocket.receive_json() == {
+            "type": "comment.edited",
+            "id": 3,
+            "post_id": 7,
+            "content": "first!",
+        }
+        client.delete("/api/posts/7/all-comments/3")
+        assert websocket.receive_json() == {
+            "type": "comment.deleted",
+            "id": 3,
+            "post_id": 7,
+        }
+    assert [row.id for row in session.deleted] == [3]
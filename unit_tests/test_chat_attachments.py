@@ -0,0 +1,125 @@
+import asyncio
+import base64
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from chat import attachments
+from db import models
+from dependencies import cipher
+from unit_tests.conftest import FakeWebSocket, flush, make_token
+
+
+@pytest.fixture
+def chat_socket(session, user, tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "UPLOAD_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(attachments, "MAX_ATTACHMENT_BYTES", 1024)
+    session.results[models.DBConversationMember] = [user.id, 2]
+    cookies = {"access_token": make_token(user.email, timedelta(minutes=1))}
+    return FakeWebSocket(cookies=cookies)
+
+
+async def run_chat(socket: FakeWebSocket, frames: list):
+    await main.manager.start()
+    handler = asyncio.create_task(main.websocket_chat(socket, chat_id=5))
+    for frame in frames:
+        socket.incoming.put_nowait(frame)
+    await flush()
+    socket.disconnect()
+    await handler
+    await main.manager.stop()
+
+
+def stored_files(session) -> list[models.DBFileMessage]:
+    return [row for row in session.added if isinstance(row, models.DBFileMessage)]
+
+
+async def test_binary_chunks_are_streamed_to_disk(chat_socket, session, tmp_path):
+    await run_chat(
+        chat_socket,
+        [
+            {
+                "type": "attachment",
+                "content": "look",
+                "files": [
+                    {"name": "notes.txt", "size": 10},
+                    {"name": "../../etc/passwd", "size": 3},
+                ],
+            },
+            b"hello",
+            b" you",
+            b"!",
+            b"abc",
+        ],
+    )
+
+    written = {
+        path.name.split("_", 1)[1]: path.read_bytes() for path in tmp_path.iterdir()
+    }
+    assert written == {"notes.txt": b"hello you!", "passwd": b"abc"}
+    assert len(stored_files(session)) == 2
+    link = cipher.decrypt(base64.b64decode(stored_files(session)[0].link)).decode()
+    assert link.endswith("_notes.txt")
+
+
+async def test_oversized_attachment_is_rejected_before_upload(
+    chat_socket, session, tmp_path
+):
+    await run_chat(
+        chat_socket,
+        [{"type": "attachment", "files": [{"name": "big.bin", "size": 4096}]}],
+    )
+
+    assert chat_socket.close_code == 1009
+    assert list(tmp_path.iterdir()) == []
+    assert session.added == []
+
+
+async def test_chunk_beyond_announced_size_discards_the_upload(
+    chat_socket, session, tmp_path
+):
+    await run_chat(
+        chat_socket,
+        [
+            {"type": "attachment", "files": [{"name": "a.txt", "size": 2}]},
+            b"abc",
+        ],
+    )
+
+    assert chat_socket.close_code == 1009
+    assert list(tmp_path.iterdir()) == []
+    assert stored_files(session) == []
+
+
+async def test_pongs_between_chunks_are_skipped(chat_socket, tmp_path):
+    await run_chat(
+        chat_socket,
+        [
+            {"type": "attachment", "files": [{"name": "a.txt", "size": 4}]},
+            b"ab",
+            {"type": "pong"},
+            b"cd",
+        ],
+    )
+
+    assert chat_socket.close_code is None
+    (path,) = tmp_path.iterdir()
+    assert path.read_bytes() == b"abcd"
+
+
+async def test_msgpack_sockets_cannot_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "UPLOAD_DIRECTORY", str(tmp_path))
+    socket = FakeWebSocket()
+    socket.incoming.put_nowait(b"\x81\xa4type\xa4pong")
+
+    with pytest.raises(attachments.AttachmentError) as error:
+        await attachments.receive_attachments(
+            socket,
+            [{"name": "a.txt", "size": 16}],
+            SimpleNamespace(msgpack=True, touch=lambda: None),
+        )
+
+    assert error.value.close_code == 1003
+    assert list(tmp_path.iterdir()) == []
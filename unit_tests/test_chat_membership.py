@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from chat.membership import membership_cache
+from db import models
+from unit_tests.conftest import make_token
+
+
+@pytest.fixture(autouse=True)
+def login(client, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+
+def test_membership_is_resolved_once_per_connection(client, session, user):
+    session.results[models.DBConversationMember] = [user.id, 2]
+
+    with client.websocket_connect("/ws/chats/5") as websocket:
+        for content in ("hi", "how are you?"):
+            websocket.send_json({"content": content})
+            assert websocket.receive_json()["content"] == content
+
+    assert len(session.queries_for(models.DBConversationMember)) == 1
+    message = next(row for row in session.added if isinstance(row, models.DBMessage))
+    assert (message.sender_id, message.receiver_id) == (user.id, 2)
+
+
+def test_non_member_is_refused_at_handshake(client, session, monkeypatch):
+    monkeypatch.setattr(membership_cache, "members", {})
+    session.results[models.DBConversationMember] = [2, 3]
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/ws/chats/5"):
+            pass
+
+    assert session.added == []
+    # No socket holds the chat, probing it leaves nothing cached.
+    assert membership_cache.members == {}
+
+
+def test_invalidate_user_drops_their_conversations():
+    membership_cache.members = {1: frozenset({1, 2}), 2: frozenset({3, 4})}
+
+    membership_cache.invalidate_user(2)
+
+    assert membership_cache.members == {2: frozenset({3, 4})}
+    membership_cache.members = {}
@@ -0,0 +1,136 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from chat.membership import membership_cache
+from db import models
+from dependencies import cipher
+from unit_tests.conftest import FakeWebSocket, flush, make_token
+from websocket_package.serialization import dumps
+
+
+@pytest.fixture(autouse=True)
+def login(client, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+
+def make_message(id: int, content: str):
+    return SimpleNamespace(
+        id=id,
+        sender_id=2,
+        sender=SimpleNamespace(username="bob", profile_picture="bob.jpg"),
+        conversation_id=5,
+        content=base64.b64encode(cipher.encrypt(content.encode())).decode(),
+        created_at=datetime(2024, 1, 1),
+        files=[],
+    )
+
+
+def test_reconnect_replays_only_the_missed_messages(client, session, user):
+    session.results[models.DBConversationMember] = [user.id, 2]
+    session.results[models.DBMessage] = [make_message(4, "hi"), make_message(5, "yo")]
+
+    with client.websocket_connect("/ws/chats/5?last_message_id=3") as websocket:
+        replay = websocket.receive_json()
+
+    assert replay["type"] == "replay"
+    assert replay["complete"] is True
+    assert [message["content"] for message in replay["messages"]] == ["hi", "yo"]
+    (query,) = session.queries_for(models.DBMessage)
+    compiled = query.compile()
+    assert "messages.id > :id_1" in str(compiled)
+    assert compiled.params["id_1"] == 3
+
+
+def test_socket_without_cursor_is_not_replayed_to(client, session, user):
+    session.results[models.DBConversationMember] = [user.id, 2]
+
+    with client.websocket_connect("/ws/chats/5") as websocket:
+        websocket.send_json({"content": "live"})
+        assert websocket.receive_json()["content"] == "live"
+
+    assert session.queries_for(models.DBMessage) == []
+
+
+async def test_live_messages_wait_for_the_replay(make_manager):
+    manager = await make_manager()
+    socket = FakeWebSocket()
+    connection = await manager.connect(socket)
+
+    manager.hold(connection)
+    await manager.join(connection, 5, "chat")
+    await manager.broadcast(dumps({"id": 4}), 5, "chat")
+    await manager.broadcast(dumps({"id": 6}), 5, "chat")
+    manager.send(connection, dumps({"type": "replay"}))
+    await flush()
+    assert socket.sent == ['{"type":"replay"}']
+
+    manager.release(
+        connection, keep=lambda frame: None if b'"id":4' in frame.data else frame
+    )
+    await flush()
+    assert socket.sent == ['{"type":"replay"}', '{"id":6}']
+
+
+async def test_multiplexed_replay_filters_only_the_chat_channel(
+    session, user, monkeypatch
+):
+    monkeypatch.setattr(membership_cache, "members", {})
+    monkeypatch.setitem(main.manager.coalesce_windows, "chat", 0.001)
+    session.results[models.DBConversationMember] = [user.id, 2]
+    cookies = {"access_token": make_token(user.email, timedelta(minutes=1))}
+    socket = FakeWebSocket(cookies=cookies)
+
+    async def get_messages_after(db, chat_id, message_id):
+        # Arrive while the replay is read: a comment without its id yet and
+        # two chat messages coalesced into one frame.
+        await main.manager.broadcast(dumps({"id": 50}), 7, "post")
+        await main.manager.broadcast(dumps({"id": None}), 7, "post")
+        await main.manager.broadcast(dumps({"id": 95}), 9, "chat")
+        await main.manager.broadcast(dumps({"id": 101}), 9, "chat")
+        await asyncio.sleep(0.005)
+        return [SimpleNamespace(id=100, model_dump=lambda: {"id": 100})]
+
+    monkeypatch.setattr(main, "get_messages_after", get_messages_after)
+    await main.manager.start()
+    handler = asyncio.create_task(main.websocket_multiplexed(socket))
+    socket.incoming.put_nowait({"type": "subscribe", "channel": "post:7"})
+    socket.incoming.put_nowait(
+        {"type": "subscribe", "channel": "chat:9", "last_message_id": 90}
+    )
+    await flush()
+    socket.disconnect()
+    await handler
+    await main.manager.stop()
+
+    events = [json.loads(frame) for frame in socket.sent]
+    data = [event["data"] for event in events if "data" in event]
+    assert data == [{"id": 50}, {"id": None}, [{"id": 101}]]
+    replay = next(event for event in events if event.get("type") == "replay")
+    assert replay["messages"] == [{"id": 100}]
+
+
+async def test_failed_replay_does_not_leak_the_connection(session, user, monkeypatch):
+    monkeypatch.setattr(membership_cache, "members", {})
+    session.results[models.DBConversationMember] = [user.id, 2]
+    cookies = {"access_token": make_token(user.email, timedelta(minutes=1))}
+    socket = FakeWebSocket(query_params={"last_message_id": "3"}, cookies=cookies)
+
+    async def get_messages_after(db, chat_id, message_id):
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(main, "get_messages_after", get_messages_after)
+    await main.manager.start()
+    try:
+        with pytest.raises(RuntimeError):
+            await main.websocket_chat(socket, chat_id=5)
+        assert main.manager.connections == {}
+        assert main.manager.users == {}
+        assert main.manager.active_connections["chat"] == {}
+    finally:
+        await main.manager.stop()
@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+import main
+from websocket_package.serialization import dumps
+from comments import write_behind
+from comments.write_behind import CommentWriter
+from unit_tests.conftest import FakeSession, FakeWebSocket, flush, make_token
+
+
+class FailingSession(FakeSession):
+    """Rejects every insert that contains a comment reading "bad"."""
+
+    async def execute(self, statement, *args, **kwargs):
+        if statement.is_insert and any(row["content"] == "bad" for row in args[0]):
+            raise ValueError("violates foreign key constraint")
+        return await super().execute(statement, *args, **kwargs)
+
+
+async def test_queued_comments_are_inserted_in_one_statement(make_manager, user):
+    manager = await make_manager()
+    listener = FakeWebSocket()
+    await manager.connect(listener, 1, "post")
+    session = FakeSession()
+    writer = CommentWriter(session, manager.broadcast)
+
+    comments = [writer.add(user, 1, f"comment {i}") for i in range(3)]
+    await writer.flush()
+    await flush()
+
+    ((statement, rows),) = session.inserted
+    assert [row["content"] for row in rows] == ["comment 0", "comment 1", "comment 2"]
+    assert listener.sent == [
+        dumps(
+            {
+                "type": "comments.persisted",
+                "ids": {
+                    comment.provisional_id: i + 1 for i, comment in enumerate(comments)
+                },
+            }
+        ).decode()
+    ]
+
+
+async def test_failed_batch_keeps_the_good_comments(make_manager, user):
+    manager = await make_manager()
+    listener = FakeWebSocket()
+    await manager.connect(listener, 1, "post")
+    writer = CommentWriter(FailingSession(), manager.broadcast)
+
+    good = writer.add(user, 1, "good")
+    bad = writer.add(user, 1, "bad")
+    await writer.flush()
+    await flush()
+
+    assert listener.sent == [
+        '{"type":"comments.persisted","ids":{"%s":1}}' % good.provisional_id,
+        '{"type":"comments.rejected","provisional_ids":["%s"]}' % bad.provisional_id,
+    ]
+    assert (writer.flushed_count, writer.rejected_count) == (1, 1)
+
+
+async def test_full_batch_and_shutdown_both_flush(make_manager, user, monkeypatch):
+    monkeypatch.setattr(write_behind, "FLUSH_INTERVAL_SECONDS", 60)
+    monkeypatch.setattr(write_behind, "FLUSH_BATCH_SIZE", 2)
+    manager = await make_manager()
+    session = FakeSession()
+    writer = CommentWriter(session, manager.broadcast)
+    writer.start()
+
+    writer.add(user, 1, "first")
+    writer.add(user, 1, "second")
+    await flush()
+    assert len(session.inserted) == 1
+
+    writer.add(user, 1, "third")
+    await writer.stop()
+    assert [len(rows) for _, rows in session.inserted] == [2, 1]
+    assert writer.pending == []
+
+
+def test_socket_broadcasts_before_the_insert(client, session, user, monkeypatch):
+    monkeypatch.setattr(main, "WRITE_BEHIND_ENABLED", True)
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+    with client.websocket_connect("/ws/posts/1") as websocket:
+        websocket.send_json("fast")
+        event = websocket.receive_json()
+
+    assert event["content"] == "fast"
+    assert event["provisional_id"]
+    assert session.added == []
+    assert main.comment_writer.pending[-1][1].provisional_id == event["provisional_id"]
+    main.comment_writer.pending.clear()
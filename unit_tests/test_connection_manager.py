@@ -0,0 +1,340 @@
+import asyncio
+import json
+import zlib
+from types import SimpleNamespace
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from websocket_package import manager as manager_module
+from websocket_package.frames import receive_frame
+from websocket_package.serialization import dumps
+from unit_tests.conftest import FakeWebSocket, flush
+
+
+async def test_broadcast_reaches_sockets_on_every_worker(make_manager, hub):
+    worker_1 = await make_manager()
+    worker_2 = await make_manager()
+    alice, bob = FakeWebSocket("alice"), FakeWebSocket("bob")
+
+    await worker_1.connect(alice, 1, "chat")
+    await worker_2.connect(bob, 1, "chat")
+    await worker_1.broadcast(b"hello", 1, "chat")
+    await flush()
+
+    assert alice.sent == ["hello"]
+    assert bob.sent == ["hello"]
+
+
+async def test_worker_subscribes_only_to_groups_with_local_sockets(make_manager, hub):
+    worker_1 = await make_manager()
+    worker_2 = await make_manager()
+    socket = FakeWebSocket()
+
+    await worker_1.connect(socket, 7, "post")
+    assert hub.subscribers["post:7"] == {worker_1.broker}
+
+    await worker_2.broadcast(b"comment", 7, "post")
+    await flush()
+    assert socket.sent == ["comment"]
+
+    await worker_1.disconnect(socket, 7, "post")
+    assert "post:7" not in hub.subscribers
+    assert 7 not in worker_1.active_connections["post"]
+
+
+async def test_slow_consumer_does_not_stall_the_room(make_manager):
+    manager = await make_manager()
+    slow, fast = FakeWebSocket("slow"), FakeWebSocket("fast")
+    slow.send_gate = asyncio.Event()
+
+    await manager.connect(slow, 1, "post")
+    await manager.connect(fast, 1, "post")
+    for i in range(3):
+        await manager.broadcast(f"comment {i}".encode(), 1, "post")
+    await flush()
+
+    assert fast.sent == ["comment 0", "comment 1", "comment 2"]
+    assert slow.sent == []
+    assert manager.queue_depth() == 2
+
+
+async def test_queue_overflow_evicts_the_client(make_manager, monkeypatch):
+    monkeypatch.setattr(manager_module, "OUTBOUND_QUEUE_SIZE", 2)
+    manager = await make_manager()
+    slow = FakeWebSocket("slow")
+    slow.send_gate = asyncio.Event()
+    await manager.connect(slow, 1, "chat")
+
+    for i in range(4):
+        await manager.broadcast(f"message {i}".encode(), 1, "chat")
+    slow.send_gate.set()
+    await flush()
+
+    assert slow.close_code == manager_module.SLOW_CONSUMER_CLOSE_CODE
+    assert manager.stats()["evicted"] == 1
+    assert 1 not in manager.active_connections["chat"]
+
+
+async def test_send_deadline_evicts_the_client(make_manager, monkeypatch):
+    monkeypatch.setattr(manager_module, "SEND_TIMEOUT_SECONDS", 0.01)
+    manager = await make_manager()
+    stuck = FakeWebSocket("stuck")
+    stuck.send_gate = asyncio.Event()
+    await manager.connect(stuck, 1, "chat")
+
+    await manager.broadcast(b"first", 1, "chat")
+    await asyncio.sleep(0.05)
+    await manager.broadcast(b"second", 1, "chat")
+    await flush()
+
+    assert stuck.closed
+    assert manager.stats() == {
+        "connections": 0,
+        "queue_depth": 0,
+        "evicted": 1,
+        "send_errors": 0,
+        "reaped": 0,
+        "draining": False,
+    }
+
+
+async def test_payload_is_shared_and_sent_binary_on_opt_in(make_manager):
+    manager = await make_manager()
+    text_client = FakeWebSocket("text")
+    binary_client = FakeWebSocket("binary", query_params={"frames": "binary"})
+    await manager.connect(text_client, 3, "post")
+    await manager.connect(binary_client, 3, "post")
+
+    payload = dumps({"content": "hi"})
+    await manager.broadcast(payload, 3, "post")
+    await flush()
+
+    assert text_client.sent == ['{"content":"hi"}']
+    assert binary_client.sent[0] is payload
+
+
+async def test_large_frames_are_compressed_on_opt_in(make_manager, monkeypatch):
+    monkeypatch.setitem(manager_module.COMPRESS_MIN_BYTES, "post", 32)
+    manager = await make_manager()
+    plain = FakeWebSocket("plain")
+    compressed = FakeWebSocket("deflate", query_params={"compress": "deflate"})
+    other = FakeWebSocket("other", query_params={"compress": "deflate"})
+    await manager.connect(plain, 3, "post")
+    await manager.connect(compressed, 3, "post")
+    await manager.connect(other, 3, "post")
+
+    small, large = dumps({"content": "hi"}), dumps({"content": "hi " * 50})
+    await manager.broadcast(small, 3, "post")
+    await manager.broadcast(large, 3, "post")
+    await flush()
+
+    assert plain.sent == [small.decode(), large.decode()]
+    assert compressed.sent[0] == small.decode()
+    assert zlib.decompress(compressed.sent[1]) == large
+    # Compressed once for the whole room.
+    assert compressed.sent[1] is other.sent[1]
+
+
+async def test_compression_threshold_is_per_endpoint(make_manager, monkeypatch):
+    monkeypatch.setitem(manager_module.COMPRESS_MIN_BYTES, "chat", 0)
+    monkeypatch.setitem(manager_module.COMPRESS_MIN_BYTES, "mux", 1)
+    manager = await make_manager()
+    chat = FakeWebSocket("chat", query_params={"compress": "deflate"})
+    multiplexed = FakeWebSocket("mux", query_params={"compress": "deflate"})
+    await manager.connect(chat, 1, "chat")
+    connection = await manager.connect(multiplexed, multiplexed=True)
+    await manager.join(connection, 1, "chat")
+
+    await manager.broadcast(b'{"content":"hi"}', 1, "chat")
+    await flush()
+
+    assert chat.sent == ['{"content":"hi"}']
+    assert zlib.decompress(multiplexed.sent[0]) == (
+        b'{"channel":"chat:1","data":{"content":"hi"}}'
+    )
+
+
+async def test_chat_is_not_stuck_behind_a_huge_room(make_manager):
+    manager = await make_manager()
+    manager.send_budget = 4
+    listeners = [FakeWebSocket(str(i)) for i in range(20)]
+    for socket in listeners:
+        await manager.connect(socket, 1, "post")
+    chat = FakeWebSocket("chat")
+    chat_connection = await manager.connect(chat, 2, "chat")
+
+    await manager.broadcast(b"comment", 1, "post")
+    await manager.broadcast(b"message", 2, "chat")
+    await asyncio.sleep(0)
+
+    # One loop iteration: the chat went out, the room got the rest of the budget.
+    assert chat_connection.queue.qsize() == 1
+    assert manager.queue_depth() == 4
+    assert manager.scheduled == 1
+
+    # Comments arriving meanwhile are queued behind it, in order.
+    await manager.broadcast(b"second", 1, "post")
+    await manager.broadcast(b"third", 1, "post")
+
+    await flush()
+    assert chat.sent == ["message"]
+    assert all(socket.sent == ["comment", "second", "third"] for socket in listeners)
+    assert manager.scheduled == 0
+
+
+async def test_rooms_of_a_lane_take_turns(make_manager, monkeypatch):
+    monkeypatch.setattr(manager_module, "ROOM_QUANTUM", 1)
+    manager = await make_manager()
+    manager.send_budget = 2
+    for i in range(10):
+        await manager.connect(FakeWebSocket(str(i)), 1, "post")
+    small_room = await manager.connect(FakeWebSocket("small"), 2, "post")
+
+    await manager.broadcast(b"busy", 1, "post")
+    await manager.broadcast(b"quiet", 2, "post")
+    await asyncio.sleep(0)
+
+    assert small_room.queue.qsize() == 1
+    assert manager.queue_depth() == 2
+
+
+async def test_heartbeat_pings_live_sockets_and_reaps_silent_ones(
+    make_manager, monkeypatch
+):
+    monkeypatch.setattr(manager_module, "IDLE_TIMEOUT_SECONDS", 0.05)
+    manager = await make_manager()
+    opted_in = {"heartbeat": "ping"}
+    live = FakeWebSocket("live", query_params=opted_in)
+    silent = FakeWebSocket("silent", query_params=opted_in)
+    quiet = FakeWebSocket("quiet")
+    await manager.connect(live, 1, "post")
+    live_connection = manager.connections[live]
+    await manager.connect(silent, 1, "post")
+    await manager.connect(quiet, 1, "post")
+
+    manager.sweep()
+    await flush()
+    assert live.sent == silent.sent == ['{"type":"ping"}']
+    assert quiet.sent == []
+
+    await asyncio.sleep(0.06)
+    live_connection.touch()
+    manager.sweep()
+    await flush()
+
+    assert silent.close_code == manager_module.IDLE_CLOSE_CODE
+    # Not opted in, left to the protocol level pings.
+    assert quiet.sent == [] and not quiet.closed
+    assert list(manager.connections) == [live, quiet]
+    assert manager.active_connections["post"][1] == {
+        live_connection,
+        manager.connections[quiet],
+    }
+    assert manager.stats()["reaped"] == 1
+
+
+async def test_protocol_ping_timeouts_count_as_reaped(make_manager):
+    manager = await make_manager()
+    timed_out = FakeWebSocket("timed out")
+    left = FakeWebSocket("left")
+    for socket, code in (
+        (timed_out, manager_module.PING_TIMEOUT_CLOSE_CODE),
+        (left, 1000),
+    ):
+        connection = await manager.connect(socket, 1, "post")
+        socket.disconnect(code)
+        with pytest.raises(WebSocketDisconnect):
+            await receive_frame(socket, connection)
+        await manager.disconnect(socket, 1, "post")
+
+    assert manager.connections == {}
+    assert manager.stats()["reaped"] == 1
+
+
+async def test_heartbeat_runs_in_the_background(make_manager, monkeypatch):
+    monkeypatch.setattr(manager_module, "HEARTBEAT_INTERVAL_SECONDS", 0.01)
+    monkeypatch.setattr(manager_module, "IDLE_TIMEOUT_SECONDS", 0.03)
+    manager = await make_manager()
+    socket = FakeWebSocket(query_params={"heartbeat": "ping"})
+    await manager.connect(socket, 1, "chat")
+
+    await asyncio.sleep(0.1)
+
+    assert '{"type":"ping"}' in socket.sent
+    assert socket.close_code == manager_module.IDLE_CLOSE_CODE
+    assert manager.connections == {}
+
+
+async def test_events_within_the_window_are_coalesced(make_manager):
+    manager = await make_manager()
+    manager.coalesce_windows["post"] = 0.02
+    post, chat = FakeWebSocket("post"), FakeWebSocket("chat")
+    await manager.connect(post, 1, "post")
+    await manager.connect(chat, 1, "chat")
+
+    for i in range(3):
+        await manager.broadcast(dumps({"id": i}), 1, "post")
+        await manager.broadcast(dumps({"id": i}), 1, "chat")
+    await flush()
+    assert post.sent == []
+    assert len(chat.sent) == 3
+
+    await asyncio.sleep(0.03)
+    assert post.sent == ['[{"id":0},{"id":1},{"id":2}]']
+
+    await manager.broadcast(dumps({"id": 3}), 1, "post")
+    await asyncio.sleep(0.03)
+    assert post.sent[-1] == '{"id":3}'
+
+
+async def test_sockets_are_indexed_by_user(make_manager):
+    manager = await make_manager()
+    alice, bob = SimpleNamespace(id=1), SimpleNamespace(id=2)
+    phone, laptop, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    phone_connection = await manager.connect(phone, 1, "chat", user=alice)
+    await manager.connect(laptop, 7, "post", user=alice)
+    await manager.connect(other, 1, "chat", user=bob)
+
+    await manager.disconnect(laptop, 7, "post")
+
+    assert manager.sockets_of(1) == {phone_connection}
+    await manager.disconnect(phone, 1, "chat")
+    assert manager.sockets_of(1) == set()
+    assert list(manager.users) == [2]
+
+
+async def test_drain_waits_for_writes_then_spreads_reconnects(make_manager):
+    manager = await make_manager()
+    sockets = [FakeWebSocket(str(i)) for i in range(20)]
+    for socket in sockets:
+        await manager.connect(socket, 1, "chat")
+    await manager.broadcast(b"last", 1, "chat")
+    writes = [1]
+    asyncio.get_running_loop().call_later(0.05, writes.clear)
+
+    await manager.drain(timeout=1, pending_writes=lambda: len(writes))
+
+    assert manager.draining
+    assert manager.connections == {}
+    delays = set()
+    for socket in sockets:
+        assert socket.sent == ["last"]
+        assert socket.close_code == manager_module.SERVICE_RESTART_CLOSE_CODE
+        delays.add(json.loads(socket.close_reason)["reconnect_after"])
+    assert len(delays) > 1
+    assert all(
+        0 <= delay <= manager_module.RECONNECT_WINDOW_SECONDS for delay in delays
+    )
+
+
+async def test_drain_gives_up_on_stuck_writes(make_manager):
+    manager = await make_manager()
+    stuck = FakeWebSocket()
+    stuck.send_gate = asyncio.Event()
+    await manager.connect(stuck, 1, "post")
+    await manager.broadcast(b"never sent", 1, "post")
+
+    await manager.drain(timeout=0.1)
+
+    assert stuck.close_code == manager_module.SERVICE_RESTART_CLOSE_CODE
@@ -0,0 +1,51 @@
+import base64
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from db import models
+from dependencies import cipher
+from unit_tests.conftest import make_token
+
+
+@pytest.fixture(autouse=True)
+def login(client, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+
+def test_message_sent_over_rest_reaches_the_chat_socket(client, session, user):
+    session.results[models.DBConversationMember] = [user.id, 2]
+    session.results[models.DBConversation] = [
+        SimpleNamespace(
+            id=5, members=[SimpleNamespace(user_id=user.id), SimpleNamespace(user_id=2)]
+        )
+    ]
+    # The row the endpoint reloads for its response.
+    session.results[models.DBMessage] = [
+        SimpleNamespace(
+            id=2,
+            sender=SimpleNamespace(
+                id=user.id, username=user.username, profile_picture=""
+            ),
+            conversation_id=5,
+            content=base64.b64encode(cipher.encrypt(b"over rest")).decode(),
+            created_at=datetime(2024, 1, 1),
+            files=[],
+        )
+    ]
+
+    with client.websocket_connect("/ws/chats/5") as websocket:
+        websocket.send_json({"content": "over the socket"})
+        assert websocket.receive_json()["content"] == "over the socket"
+
+        response = client.post(
+            "/api/chats/2/send-message", json={"content": "over rest"}
+        )
+        assert response.status_code == 200
+        assert response.json()["content"] == "over rest"
+
+        live = websocket.receive_json()
+    assert (live["content"], live["conversation_id"]) == ("over rest", 5)
+    messages = [row for row in session.added if isinstance(row, models.DBMessage)]
+    assert [message.conversation_id for message in messages] == [5, 5]
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from db import models
+from unit_tests.conftest import make_token
+from websocket_package.serialization import MSGPACK_MEDIA_TYPE, packb, unpackb
+
+
+@pytest.fixture(autouse=True)
+def login(client, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+
+def test_socket_speaks_msgpack_once_negotiated(client, session):
+    with client.websocket_connect("/ws/posts/1", subprotocols=["msgpack"]) as ws:
+        assert ws.accepted_subprotocol == "msgpack"
+        ws.send_bytes(packb("packed comment"))
+        event = unpackb(ws.receive_bytes())
+
+    assert event["content"] == "packed comment"
+
+
+def test_json_sockets_are_unchanged(client, session):
+    with client.websocket_connect("/ws/posts/1", subprotocols=["json"]) as ws:
+        assert ws.accepted_subprotocol == "json"
+        ws.send_json("plain comment")
+        assert ws.receive_json()["content"] == "plain comment"
+
+    with client.websocket_connect("/ws/posts/1") as ws:
+        assert ws.accepted_subprotocol is None
+        ws.send_json("plain comment")
+        assert ws.receive_json()["content"] == "plain comment"
+
+
+def test_post_list_is_negotiated_through_accept(client, session, user):
+    session.results[models.DBPost] = [
+        SimpleNamespace(
+            id=3,
+            topic="topic",
+            content="content",
+            tags=["tag"],
+            created_at=datetime(2024, 1, 1, 12),
+            user=user,
+            likes=[],
+            comments=[],
+            files=[],
+        )
+    ]
+
+    as_json = client.get("/api/posts")
+    as_msgpack = client.get("/api/posts", headers={"Accept": MSGPACK_MEDIA_TYPE})
+
+    assert as_json.headers["content-type"] == "application/json"
+    assert as_json.json()["items"][0]["created_at"] == "2024-01-01T12:00:00Z"
+    assert as_msgpack.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert as_msgpack.headers["vary"] == "Accept"
+    page = unpackb(as_msgpack.content)
+    assert page["items"][0]["id"] == 3
+    assert page["items"][0]["created_at"] == datetime(
+        2024, 1, 1, 12, tzinfo=timezone.utc
+    )
+    assert len(as_msgpack.content) < len(as_json.content)
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+import pytest
+
+from chat.membership import membership_cache
+from db import models
+from unit_tests.conftest import FakeWebSocket, flush, make_token
+from websocket_package.manager import manager
+
+
+@pytest.fixture(autouse=True)
+def login(client, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+
+def test_one_socket_follows_many_channels(client, session, user):
+    session.results[models.DBConversationMember] = [user.id, 2]
+
+    with client.websocket_connect("/ws") as websocket:
+        for channel in ("chat:5", "post:1"):
+            websocket.send_json({"type": "subscribe", "channel": channel})
+            assert websocket.receive_json() == {
+                "type": "subscribed",
+                "channel": channel,
+            }
+        assert len(manager.connections) == 1
+
+        websocket.send_json({"type": "publish", "channel": "post:1", "content": "hi"})
+        event = websocket.receive_json()
+        assert event["channel"] == "post:1"
+        assert event["data"]["content"] == "hi"
+
+        websocket.send_json({"type": "publish", "channel": "chat:5", "content": "yo"})
+        event = websocket.receive_json()
+        assert event["channel"] == "chat:5"
+        assert event["data"]["conversation_id"] == 5
+
+        websocket.send_json({"type": "unsubscribe", "channel": "post:1"})
+        assert websocket.receive_json()["type"] == "unsubscribed"
+        assert 1 not in manager.active_connections["post"]
+
+    message = next(row for row in session.added if isinstance(row, models.DBMessage))
+    assert (message.sender_id, message.receiver_id) == (user.id, 2)
+
+
+def test_subscribing_to_a_foreign_chat_is_refused(client, session, monkeypatch):
+    monkeypatch.setattr(membership_cache, "members", {})
+    session.results[models.DBConversationMember] = [2, 3]
+
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"type": "subscribe", "channel": "chat:5"})
+        assert websocket.receive_json()["type"] == "error"
+        websocket.send_json({"type": "publish", "channel": "chat:5", "content": "x"})
+        assert websocket.receive_json()["detail"] == "Not subscribed."
+
+    assert 5 not in manager.active_connections["chat"]
+    assert 5 not in membership_cache.members
+
+
+async def test_tagged_frame_is_built_once_per_event(make_manager):
+    worker = await make_manager()
+    sockets = [FakeWebSocket(str(i)) for i in range(3)]
+    for socket in sockets:
+        connection = await worker.connect(socket, multiplexed=True)
+        await worker.join(connection, 1, "post")
+        await worker.join(connection, 2, "chat")
+
+    await worker.broadcast(b'{"id":1}', 1, "post")
+    await worker.broadcast(b'{"id":2}', 2, "chat")
+    await flush()
+
+    for socket in sockets:
+        # Chats are scheduled ahead of post comments.
+        assert socket.sent == [
+            '{"channel":"chat:2","data":{"id":2}}',
+            '{"channel":"post:1","data":{"id":1}}',
+        ]
+    assert len(worker.connections) == 3
+    assert sockets[0].sent[0] is sockets[1].sent[0]
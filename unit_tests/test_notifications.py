@@ -0,0 +1,73 @@
+import asyncio
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from chat.views import publish_message
+from db import models
+from posts.owners import post_owners
+from unit_tests.conftest import FakeWebSocket, flush, make_token
+
+
+@pytest.fixture
+async def me(session, user):
+    """A /ws/me socket of ``user``, with the app's manager running."""
+    await main.manager.start()
+    post_owners.owners.clear()
+    socket = FakeWebSocket(
+        cookies={"access_token": make_token(user.email, timedelta(minutes=1))}
+    )
+    handler = asyncio.create_task(main.websocket_notifications(socket))
+    await flush()
+    yield socket
+    socket.disconnect()
+    await handler
+    await main.manager.stop()
+
+
+@pytest.fixture
+def bob():
+    return SimpleNamespace(
+        id=2, username="bob", email="bob@example.com", profile_picture="bob.jpg"
+    )
+
+
+async def test_author_is_notified_of_comments_on_their_post(me, session, user, bob):
+    session.results[models.DBPost] = [user.id]
+
+    await main.create_comment(bob, 7, "Nice post!")
+    await main.create_comment(bob, 7, "Really.")
+    await main.create_comment(user, 7, "Thanks")
+    await flush()
+
+    assert [json.loads(frame) for frame in me.sent] == [
+        {
+            "type": "comment.created",
+            "post_id": 7,
+            "user_id": bob.id,
+            "username": "bob",
+            "content": content,
+        }
+        for content in ("Nice post!", "Really.")
+    ]
+    # The author is looked up once per post.
+    assert len(session.queries_for(models.DBPost)) == 1
+
+
+async def test_receiver_is_notified_of_new_messages(me, session, user, bob):
+    await publish_message(
+        db=session,
+        sender=bob,
+        conversation_id=5,
+        receiver_id=user.id,
+        content="x" * 500,
+    )
+    await flush()
+
+    (event,) = [json.loads(frame) for frame in me.sent]
+    assert event["type"] == "message.created"
+    assert (event["conversation_id"], event["user_id"]) == (5, bob.id)
+    assert event["content"] == "x" * 100
@@ -0,0 +1,66 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from chat import presence as presence_module
+from chat.presence import PresenceTracker
+from unit_tests.conftest import FakeSession, FakeWebSocket, flush
+
+
+@pytest.fixture
+async def tracked(make_manager, monkeypatch):
+    monkeypatch.setattr(presence_module, "OFFLINE_GRACE_SECONDS", 0.05)
+    monkeypatch.setattr(presence_module, "TYPING_TTL_SECONDS", 0.05)
+    manager = await make_manager()
+    session = FakeSession()
+    manager.presence = PresenceTracker(session, manager.broadcast)
+    return manager, session
+
+
+def events(socket) -> list[dict]:
+    return [json.loads(frame) for frame in socket.sent]
+
+
+async def test_presence_is_announced_once_and_survives_reconnects(tracked):
+    manager, session = tracked
+    alice, bob = SimpleNamespace(id=1), SimpleNamespace(id=2)
+    watcher = FakeWebSocket("alice")
+    await manager.connect(watcher, 5, "chat", user=alice)
+
+    first = FakeWebSocket("bob")
+    await manager.connect(first, 5, "chat", user=bob)
+    await manager.disconnect(first)
+    # Back before the grace period is over, nobody is told bob left.
+    await manager.connect(FakeWebSocket("bob again"), 5, "chat", user=bob)
+    await asyncio.sleep(0.1)
+    assert [event["online"] for event in events(watcher)] == [True]
+    assert manager.presence.snapshot(5, alice.id)["online"] == [bob.id]
+
+    await manager.disconnect(manager.users[bob.id].copy().pop().websocket)
+    await asyncio.sleep(0.1)
+    offline = events(watcher)[-1]
+    assert (offline["user_id"], offline["online"]) == (bob.id, False)
+    assert offline["last_seen"].endswith("Z")
+
+    await manager.presence.flush()
+    ((_, rows),) = session.updated
+    assert sorted(row["id"] for row in rows) == [alice.id, bob.id]
+
+
+async def test_typing_is_debounced_and_expires(tracked):
+    manager, _ = tracked
+    watcher = FakeWebSocket()
+    await manager.connect(watcher, 5, "chat", user=SimpleNamespace(id=1))
+
+    for _ in range(10):
+        await manager.presence.set_typing(2, 5, True)
+    await flush()
+    assert manager.presence.snapshot(5, 1)["typing"] == [2]
+
+    await asyncio.sleep(0.06)
+    await manager.presence.expire_typing()
+    await flush()
+    assert [event["typing"] for event in events(watcher)] == [True, False]
+    assert manager.presence.typing == {}
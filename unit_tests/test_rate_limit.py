@@ -0,0 +1,126 @@
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from db import models
+from unit_tests.conftest import make_token
+from websocket_package import rate_limit
+from websocket_package.rate_limit import FrameLimiter, frame_limiter
+
+
+def make_connection(user_id: int = 1):
+    return SimpleNamespace(
+        user=SimpleNamespace(id=user_id), frame_bucket=None, strikes=None
+    )
+
+
+@pytest.fixture(autouse=True)
+def budgets(monkeypatch):
+    monkeypatch.setattr(rate_limit, "CONNECTION_FRAMES_PER_SECOND", 1)
+    monkeypatch.setattr(rate_limit, "CONNECTION_FRAME_BURST", 2)
+    monkeypatch.setattr(rate_limit, "USER_FRAMES_PER_SECOND", 2)
+    monkeypatch.setattr(rate_limit, "USER_FRAME_BURST", 3)
+    monkeypatch.setattr(rate_limit, "THROTTLE_STRIKES", 2)
+    frame_limiter.user_buckets.clear()
+    yield
+    frame_limiter.user_buckets.clear()
+
+
+def test_connection_budget_refills_over_time():
+    limiter = FrameLimiter()
+    connection = make_connection()
+
+    assert [limiter.allow(connection, now=0) for _ in range(3)] == [
+        True,
+        True,
+        False,
+    ]
+    assert limiter.retry_after(connection) == pytest.approx(1)
+    assert limiter.allow(connection, now=1)
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_user_budget_is_shared_by_their_connections():
+    limiter = FrameLimiter()
+    first, second, other_user = make_connection(), make_connection(), make_connection(2)
+
+    assert limiter.allow(first, now=0) and limiter.allow(first, now=0)
+    assert limiter.allow(second, now=0)
+    assert not limiter.allow(second, now=0)
+    assert limiter.allow(other_user, now=0)
+    # The throttled frame did not use up the second connection's own budget.
+    assert second.frame_bucket.tokens == 1
+
+
+def test_strikes_are_forgiven_over_time():
+    limiter = FrameLimiter()
+    connection = make_connection()
+    limiter.allow(connection, now=0)
+
+    assert limiter.strike(connection, now=0)
+    assert limiter.strike(connection, now=0)
+    assert limiter.strike(connection, now=rate_limit.STRIKE_FORGIVE_SECONDS)
+    assert not limiter.strike(connection, now=rate_limit.STRIKE_FORGIVE_SECONDS)
+    assert limiter.stats()["throttle_closes"] == 1
+
+
+def test_idle_user_buckets_are_pruned():
+    limiter = FrameLimiter()
+    limiter.allow(make_connection(1), now=0)
+    limiter.allow(make_connection(2), now=0)
+
+    limiter.prune(now=10)
+
+    assert limiter.user_buckets == {}
+
+
+def test_flooding_client_is_throttled_then_closed(client, session, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+    with client.websocket_connect("/ws/posts/1") as websocket:
+        for i in range(2):
+            websocket.send_json(f"comment {i}")
+            assert websocket.receive_json()["content"] == f"comment {i}"
+        for _ in range(2):
+            websocket.send_json("spam")
+            assert websocket.receive_json()["type"] == "throttled"
+        websocket.send_json("spam")
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+
+    assert closed.value.code == rate_limit.THROTTLE_CLOSE_CODE
+    assert frame_limiter.closed_count >= 1
+
+
+def test_throttled_frames_never_reach_the_token_refresh(
+    client, session, user, monkeypatch
+):
+    refreshes = []
+
+    async def refresh_websocket_token(websocket):
+        refreshes.append(websocket)
+
+    monkeypatch.setattr(main, "refresh_websocket_token", refresh_websocket_token)
+    session.results[models.DBConversationMember] = [user.id, 2]
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+    with client.websocket_connect("/ws/chats/5") as websocket:
+        for message_id in (1, 2):
+            websocket.send_json({"type": "read", "message_id": message_id})
+        websocket.send_json({"type": "pong"})
+        # The budget is used up once both acks are in.
+        deadline = time.monotonic() + 1
+        while main.read_cursors.pending_cursor(user.id, 5) != 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        (connection,) = main.manager.connections.values()
+        connection.token_expires_at = 0
+        websocket.send_json({"type": "pong"})
+        websocket.send_json({"type": "read", "message_id": 1})
+        assert websocket.receive_json()["type"] == "throttled"
+
+    assert refreshes == []
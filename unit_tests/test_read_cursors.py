@@ -0,0 +1,87 @@
+import base64
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from chat.membership import membership_cache
+from chat.read_cursors import ReadCursorWriter
+from db import models
+from dependencies import cipher
+from unit_tests.conftest import FakeSession, make_token
+
+
+@pytest.fixture
+def login(client, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+
+def member(user_id: int, last_read_message_id=None, unread_count=0):
+    return SimpleNamespace(
+        user_id=user_id,
+        user=SimpleNamespace(id=user_id, username=f"user{user_id}", profile_picture=""),
+        last_read_message_id=last_read_message_id,
+        unread_count=unread_count,
+    )
+
+
+async def test_read_acks_are_coalesced_into_one_write():
+    session = FakeSession()
+    writer = ReadCursorWriter(session)
+    for message_id in (3, 7, 4):
+        writer.read(1, 5, message_id)
+    writer.read(2, 5, 7)
+
+    await writer.flush()
+    await writer.flush()
+    ((_, rows),) = session.updated
+    assert sorted((row["member_user_id"], row["cursor"]) for row in rows) == [
+        (1, 7),
+        (2, 7),
+    ]
+    assert writer.pending == {}
+
+
+def test_read_frame_clears_the_unread_badge(client, session, user, login, monkeypatch):
+    monkeypatch.setattr(membership_cache, "members", {})
+    session.results[models.DBConversationMember] = [user.id, 2]
+    session.results[models.DBConversation] = [
+        SimpleNamespace(
+            id=5,
+            name="New Chat",
+            created_at=datetime(2024, 1, 1),
+            members=[member(user.id, 3, 2), member(2)],
+            messages=[
+                SimpleNamespace(
+                    id=message_id,
+                    created_at=datetime(2024, 1, message_id),
+                    content=base64.b64encode(cipher.encrypt(b"hello")).decode(),
+                )
+                for message_id in (3, 4, 5)
+            ],
+        )
+    ]
+    (chat,) = client.get("/api/chats").json()["items"]
+    assert (chat["last_read_message_id"], chat["unread_count"]) == (3, 2)
+
+    with client.websocket_connect("/ws/chats/5") as websocket:
+        websocket.send_json({"type": "read", "message_id": 5})
+        deadline = time.monotonic() + 1
+        while main.read_cursors.pending_cursor(user.id, 5) is None:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    # Not written yet, the badge is cleared all the same.
+    (chat,) = client.get("/api/chats").json()["items"]
+    assert (chat["last_read_message_id"], chat["unread_count"]) == (5, 0)
+    assert session.updated == []
+
+    response = client.post("/api/chats/5/read", params={"message_id": 5})
+    assert response.status_code == 200
+    # Only a member of the chat moves a cursor in it.
+    session.results[models.DBConversationMember] = []
+    response = client.post("/api/chats/6/read", params={"message_id": 5})
+    assert response.status_code == 400
+    assert membership_cache.members == {}
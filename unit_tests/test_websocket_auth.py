@@ -0,0 +1,81 @@
+import time
+from datetime import timedelta
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from db import models
+from dependencies import decode_access_token
+from unit_tests.conftest import make_token
+from websocket_package.manager import SERVICE_RESTART_CLOSE_CODE, manager
+
+# Every socket endpoint goes through the same handshake, see main.open_socket().
+SOCKET_PATHS = ["/ws/posts/1", "/ws/me", "/ws/chats/5", "/ws"]
+
+
+def test_user_is_looked_up_once_per_connection(client, session, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+    with client.websocket_connect("/ws/posts/1") as websocket:
+        for i in range(3):
+            websocket.send_json(f"comment {i}")
+            assert websocket.receive_json()["content"] == f"comment {i}"
+
+    assert len(session.queries_for(models.DBUser)) == 1
+
+
+@pytest.mark.parametrize("path", SOCKET_PATHS)
+def test_socket_without_valid_token_is_refused(client, session, path):
+    client.cookies["access_token"] = "not-a-token"
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(path):
+            pass
+
+    assert session.queries_for(models.DBUser) == []
+
+
+def test_expired_token_is_refreshed_in_process(client, session, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(seconds=-1))
+    client.cookies["refresh_token"] = make_token(user.email, timedelta(days=1))
+
+    with client.websocket_connect("/ws/posts/1") as websocket:
+        control = websocket.receive_json()
+        assert control["type"] == "token"
+        assert decode_access_token(control["access_token"])["sub"] == user.email
+        assert control["expires_at"] > time.time()
+
+        websocket.send_json("comment")
+        assert websocket.receive_json()["content"] == "comment"
+
+
+def test_socket_without_refresh_cookie_is_refused_once_expired(client, session, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(seconds=-1))
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/ws/posts/1"):
+            pass
+
+
+@pytest.mark.parametrize("path", SOCKET_PATHS)
+def test_draining_worker_refuses_new_sockets(client, session, user, monkeypatch, path):
+    monkeypatch.setattr(manager, "draining", True)
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect(path):
+            pass
+
+    assert refused.value.code == SERVICE_RESTART_CLOSE_CODE
+    assert session.queries_for(models.DBUser) == []
+
+
+def test_frames_refused_while_draining_are_answered(client, session, user, monkeypatch):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+    with client.websocket_connect("/ws/posts/1") as websocket:
+        monkeypatch.setattr(manager, "draining", True)
+        websocket.send_json("comment")
+        assert websocket.receive_json() == {"type": "draining"}
+
+    assert session.added == []
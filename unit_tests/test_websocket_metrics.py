@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from db import models
+from unit_tests.conftest import FakeWebSocket, flush, make_token
+from websocket_package.metrics import Histogram, collect, render_prometheus
+
+
+async def test_collect_reports_groups_and_histograms(make_manager):
+    manager = await make_manager()
+    for i in range(3):
+        await manager.connect(FakeWebSocket(), 7, "post")
+    await manager.connect(FakeWebSocket(), 1, "post")
+    for i in range(2):
+        await manager.connect(FakeWebSocket(), 2, "chat")
+
+    await manager.broadcast(b"comment", 7, "post")
+    await flush()
+    metrics = collect(manager, top=2)
+
+    assert metrics["sockets_by_group_type"] == {"chat": 2, "post": 4, "user": 0}
+    assert [group["group"] for group in metrics["top_groups"]] == [7, 2]
+    assert metrics["fanout_size"]["buckets"]["5"] == 1
+    assert metrics["send_latency_seconds"]["count"] == 3
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((1, 10))
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value)
+
+    assert histogram.snapshot() == {
+        "buckets": {"1": 2, "10": 3, "+Inf": 4},
+        "sum": 56.5,
+        "count": 4,
+    }
+
+
+def test_prometheus_text_format():
+    text = render_prometheus(
+        {
+            "connections": 3,
+            "evicted": 1,
+            "draining": False,
+            "sockets_by_group_type": {"chat": 3},
+            "top_groups": [{"group_type": "chat", "group": 5, "sockets": 3}],
+            "fanout_size": Histogram((1,)).snapshot(),
+        }
+    )
+
+    assert "ws_connections 3\n" in text
+    assert "# TYPE ws_evicted_total counter\nws_evicted_total 1\n" in text
+    assert "ws_draining 0\n" in text
+    assert 'ws_sockets_by_group_type{group_type="chat"} 3\n' in text
+    assert 'ws_group_sockets{group_type="chat",group="5"} 3\n' in text
+    assert 'ws_fanout_size_bucket{le="+Inf"} 0\n' in text
+
+
+def test_metrics_are_admin_only(client, session, user):
+    client.cookies["access_token"] = make_token(user.email, timedelta(minutes=1))
+
+    user.role = models.Role.user
+    assert client.get("/api/metrics/websockets").status_code == 403
+
+    user.role = models.Role.admin
+    response = client.get("/api/metrics/websockets/prometheus")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "ws_db_pool_checked_out 0" in response.text
+    assert client.get("/api/metrics/websockets").json()["throttled"] >= 0
@@ -0,0 +1,34 @@
+import asyncio
+from datetime import timedelta
+
+import main
+from unit_tests.conftest import FakeWebSocket, flush, make_token
+
+IDLE_SOCKETS = 1000
+
+
+async def test_idle_sockets_hold_no_database_session(session, user):
+    await main.manager.start()
+    cookies = {"access_token": make_token(user.email, timedelta(minutes=1))}
+    sockets = [FakeWebSocket(cookies=cookies) for _ in range(IDLE_SOCKETS)]
+    handlers = [
+        asyncio.create_task(main.websocket_comments(socket, post_id=1))
+        for socket in sockets
+    ]
+    await flush()
+
+    assert len(main.manager.connections) == IDLE_SOCKETS
+    assert session.opened == IDLE_SOCKETS  # one for each handshake
+    assert session.open == 0
+
+    # A frame borrows a session only while it is being persisted.
+    sockets[0].incoming.put_nowait("first!")
+    await flush()
+    assert session.opened == IDLE_SOCKETS + 1
+    assert session.open == 0
+
+    for socket in sockets:
+        socket.disconnect()
+    await asyncio.gather(*handlers)
+    assert main.manager.connections == {}
+    await main.manager.stop()
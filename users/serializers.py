@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+
 from pydantic import BaseModel, EmailStr, constr, field_validator
 
 
@@ -44,9 +46,15 @@ class UserList(BaseModel):
     profile_picture: str
     username: str
     bio: str | None
+    last_seen: datetime | None = None
 
     class Config:
         from_attributes = True
+        json_encoders = {
+            datetime: lambda v: v.astimezone(timezone.utc)
+            .isoformat()
+            .replace("+00:00", "Z")
+        }
 
 
 class UserMyProfile(BaseModel):
@@ -9,6 +9,7 @@ from fastapi import Response, Request
 from dotenv import load_dotenv
 from sqlalchemy.orm import selectinload
 
+from chat.membership import membership_cache
 from db import models
 from dependencies import (
     get_current_user,
@@ -311,6 +312,7 @@ async def delete_my_account_view(
 
         await db.delete(user)
         await db.commit()
+        membership_cache.invalidate_user(user.id)
 
         response.delete_cookie(key="access_token")
         response.delete_cookie(key="refresh_token")
@@ -0,0 +1,138 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+
+import redis.asyncio as redis
+
+
+class Broker(ABC):
+    """
+    Transport that carries broadcasts between workers.
+
+    Every worker subscribes only to the channels it has local sockets for and
+    receives the published messages through ``on_message(channel, message)``.
+    """
+
+    def __init__(self):
+        self.on_message = None
+
+    async def start(self, on_message):
+        self.on_message = on_message
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def subscribe(self, channel: str): ...
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str): ...
+
+    @abstractmethod
+    async def publish(self, channel: str, message: bytes): ...
+
+
+class InMemoryHub:
+    """Shared channel table, one per "cluster" of in-process brokers."""
+
+    def __init__(self):
+        self.subscribers: dict[str, set["InMemoryBroker"]] = {}
+
+
+class InMemoryBroker(Broker):
+    """
+    Single process broker. Brokers created with the same hub behave like
+    separate workers attached to one Redis, which is what the tests rely on.
+    """
+
+    def __init__(self, hub: InMemoryHub = None):
+        super().__init__()
+        self.hub = hub or InMemoryHub()
+
+    async def subscribe(self, channel: str):
+        self.hub.subscribers.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel: str):
+        subscribers = self.hub.subscribers.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(self)
+        if not subscribers:
+            del self.hub.subscribers[channel]
+
+    async def publish(self, channel: str, message: bytes):
+        for broker in list(self.hub.subscribers.get(channel, ())):
+            if broker.on_message is not None:
+                await broker.on_message(channel, message)
+
+    async def stop(self):
+        for channel in list(self.hub.subscribers):
+            await self.unsubscribe(channel)
+
+
+class RedisBroker(Broker):
+    CHANNEL_PREFIX = "ws:"
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.redis = redis.from_url(url)
+        self.pubsub = self.redis.pubsub()
+        self.listener: asyncio.Task | None = None
+
+    async def start(self, on_message):
+        await super().start(on_message)
+        self.listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
+        await self.pubsub.aclose()
+        await self.redis.aclose()
+
+    async def subscribe(self, channel: str):
+        await self.pubsub.subscribe(self.CHANNEL_PREFIX + channel)
+
+    async def unsubscribe(self, channel: str):
+        await self.pubsub.unsubscribe(self.CHANNEL_PREFIX + channel)
+
+    async def publish(self, channel: str, message: bytes):
+        await self.redis.publish(self.CHANNEL_PREFIX + channel, message)
+
+    async def _listen(self):
+        while True:
+            # get_message() refuses to run before the first subscribe.
+            if not self.pubsub.subscribed:
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                message = await self.pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Redis broker error: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if message is None or message["type"] != "message":
+                continue
+
+            channel = message["channel"].decode().removeprefix(self.CHANNEL_PREFIX)
+            try:
+                await self.on_message(channel, message["data"])
+            except Exception as e:
+                print(f"Error delivering message from {channel}: {e}")
+
+
+def create_broker() -> Broker:
+    """Redis when WS_BROKER_URL is set, otherwise a single process broker."""
+    broker_url = os.getenv("WS_BROKER_URL")
+    if broker_url:
+        return RedisBroker(broker_url)
+    return InMemoryBroker()
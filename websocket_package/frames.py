@@ -0,0 +1,40 @@
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect
+
+from websocket_package.serialization import unpackb
+
+
+def is_pong(data) -> bool:
+    """Reply to the manager's heartbeat ping, carries nothing else."""
+    return isinstance(data, dict) and data.get("type") == "pong"
+
+
+async def receive_frame(websocket: WebSocket, connection=None) -> str | bytes:
+    """
+    Like receive_json(), but hands binary frames back untouched. Every frame
+    received counts as a sign of life for the connection's heartbeat, the
+    code of the disconnect is kept on the connection.
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        code = message.get("code", 1000)
+        if connection is not None:
+            connection.close_code = code
+        raise WebSocketDisconnect(code, message.get("reason"))
+    if connection is not None:
+        connection.touch()
+    if message.get("text") is not None:
+        return message["text"]
+    return message["bytes"]
+
+
+async def receive_message(websocket: WebSocket, connection):
+    """
+    The next frame decoded with the connection's codec: JSON text, or
+    msgpack once negotiated. Binary frames of a JSON socket come back as
+    bytes, only attachment chunks are valid there.
+    """
+    frame = await receive_frame(websocket, connection)
+    if isinstance(frame, bytes):
+        return unpackb(frame) if connection.msgpack else frame
+    return orjson.loads(frame)
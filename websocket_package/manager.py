@@ -0,0 +1,690 @@
+import asyncio
+import os
+import random
+from collections import deque
+
+from fastapi import WebSocket
+
+from websocket_package.brokers import Broker, create_broker
+from websocket_package.metrics import (
+    FANOUT_BUCKETS,
+    SEND_LATENCY_BUCKETS,
+    Histogram,
+    handler_iterations,
+)
+from websocket_package.serialization import (
+    MSGPACK_SUBPROTOCOL,
+    compress,
+    dumps,
+    json_to_msgpack,
+    negotiate_subprotocol,
+)
+
+OUTBOUND_QUEUE_SIZE = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", 64))
+SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", 5))
+# 1013 "Try Again Later", the client is too slow to keep up with the room.
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# Sockets opened with ?heartbeat=ping get a {"type": "ping"} frame this often
+# and must answer with {"type": "pong"}. The others are kept alive by the
+# server's protocol level pings, which browsers answer on their own (see
+# server.py), and are never reaped for being quiet, only for missing those.
+HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("WS_HEARTBEAT_INTERVAL_SECONDS", 25))
+# An opted in socket that sent nothing, not even a pong, for this long is reaped.
+IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", 60))
+# 1001 "Going Away", the server gave up on a silent client.
+IDLE_CLOSE_CODE = 1001
+# 1011, what the server's protocol level ping timeout closes a socket with.
+# Those sockets are counted as reaped too.
+PING_TIMEOUT_CLOSE_CODE = 1011
+# 1012 "Service Restart", sent to every socket when the worker shuts down.
+SERVICE_RESTART_CLOSE_CODE = 1012
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("WS_DRAIN_TIMEOUT_SECONDS", 10))
+# Clients are told to reconnect after a random delay within this window, so
+# they do not all come back at the same moment.
+RECONNECT_WINDOW_SECONDS = float(os.getenv("WS_RECONNECT_WINDOW_SECONDS", 30))
+# Events of one group arriving within the window go out as a single array
+# frame. 0 sends every event on its own, which is what clients expect unless
+# they opted in.
+COALESCE_WINDOW_SECONDS = {
+    "chat": float(os.getenv("WS_CHAT_COALESCE_MS", 0)) / 1000,
+    "post": float(os.getenv("WS_POST_COALESCE_MS", 0)) / 1000,
+}
+
+# Sockets opened with ?compress=deflate get the frames of at least this many
+# JSON bytes zlib compressed, as binary frames. Smaller frames cost more CPU
+# than they save, see benchmarks/ws_compression.py. 0 turns it off for the
+# endpoint, "mux" is the multiplexed /ws.
+COMPRESS_MIN_BYTES = {
+    "chat": int(os.getenv("WS_CHAT_COMPRESS_MIN_BYTES", 256)),
+    "post": int(os.getenv("WS_POST_COMPRESS_MIN_BYTES", 256)),
+    "mux": int(os.getenv("WS_MUX_COMPRESS_MIN_BYTES", 256)),
+    "user": int(os.getenv("WS_USER_COMPRESS_MIN_BYTES", 256)),
+}
+
+# Fan-outs are spread over loop iterations: at most SEND_BUDGET sockets get a
+# frame queued per iteration, so one huge room cannot hold the loop. Each
+# busy lane (group type) gets its weighted share of the budget first, chats
+# ahead of post comments, and the rooms of a lane take turns ROOM_QUANTUM
+# sockets at a time.
+SEND_BUDGET = int(os.getenv("WS_SEND_BUDGET", 512))
+ROOM_QUANTUM = int(os.getenv("WS_ROOM_QUANTUM", 64))
+LANE_WEIGHTS = {
+    "chat": int(os.getenv("WS_CHAT_LANE_WEIGHT", 4)),
+    "post": int(os.getenv("WS_POST_LANE_WEIGHT", 1)),
+    "user": int(os.getenv("WS_USER_LANE_WEIGHT", 2)),
+}
+
+
+def channel_name(group_name: int, group_type: str) -> str:
+    return f"{group_type}:{group_name}"
+
+
+def parse_channel(channel) -> tuple[str, int] | None:
+    """The (group_type, group_name) of a "chat:5" style name, None if invalid."""
+    group_type, _, group_name = str(channel).partition(":")
+    if group_type not in ("chat", "post") or not group_name.isdigit():
+        return None
+    return group_type, int(group_name)
+
+
+class Frame:
+    """
+    One encoded event shared by every recipient. The text form is decoded,
+    and every other form encoded, at most once however many sockets get it.
+    """
+
+    __slots__ = (
+        "data",
+        "channel",
+        "_text",
+        "_tagged",
+        "_packed",
+        "_compressed",
+        "_packed_compressed",
+    )
+
+    def __init__(self, data: bytes, channel: str = None):
+        self.data = data
+        self.channel = channel
+        self._text = None
+        self._tagged = None
+        self._packed = None
+        self._compressed = None
+        self._packed_compressed = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.data.decode("utf-8")
+        return self._text
+
+    @property
+    def packed(self) -> bytes:
+        """The msgpack form, transcoded once for every msgpack socket."""
+        if self._packed is None:
+            self._packed = json_to_msgpack(self.data)
+        return self._packed
+
+    def compressed(self, packed: bool = False) -> bytes:
+        """The JSON, or the msgpack form, zlib compressed once."""
+        if packed:
+            if self._packed_compressed is None:
+                self._packed_compressed = compress(self.packed)
+            return self._packed_compressed
+        if self._compressed is None:
+            self._compressed = compress(self.data)
+        return self._compressed
+
+    def tagged(self) -> "Frame":
+        """
+        The event wrapped as {"channel": ..., "data": ...} for multiplexed
+        sockets. Spliced from the encoded bytes, the payload is not re-encoded.
+        """
+        if self.channel is None:
+            return self
+        if self._tagged is None:
+            self._tagged = Frame(
+                b'{"channel":"%s","data":%s}' % (self.channel.encode(), self.data)
+            )
+        return self._tagged
+
+
+PING_FRAME = Frame(dumps({"type": "ping"}))
+
+
+class Fanout:
+    """Frames on their way to a snapshot of a group's sockets."""
+
+    __slots__ = ("frames", "connections", "queued")
+
+    def __init__(self, frame: Frame, connections: list):
+        self.frames = [frame]
+        self.connections = connections
+        # How many of the sockets already have the frames queued.
+        self.queued = 0
+
+
+class Connection:
+    """A local socket with its own outbound queue and writer task."""
+
+    __slots__ = (
+        "websocket",
+        "user",
+        "token_expires_at",
+        "binary",
+        "msgpack",
+        "multiplexed",
+        "compress_min_bytes",
+        "heartbeat",
+        "queue",
+        "writer",
+        "groups",
+        "closed",
+        "send_started",
+        "last_seen",
+        "frame_bucket",
+        "strikes",
+        "held",
+        "close_code",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user=None,
+        token_expires_at=None,
+        multiplexed: bool = False,
+        subprotocol: str = None,
+        group_type: str = None,
+    ):
+        self.websocket = websocket
+        # Resolved once at the handshake, see main.authenticate_websocket().
+        self.user = user
+        self.token_expires_at = token_expires_at
+        # Opted in with ?frames=binary, gets the payload bytes as they are.
+        self.binary = websocket.query_params.get("frames") == "binary"
+        # Negotiated through Sec-WebSocket-Protocol, both ways in msgpack.
+        self.msgpack = subprotocol == MSGPACK_SUBPROTOCOL
+        # Joined to any number of groups through /ws, gets tagged frames.
+        self.multiplexed = multiplexed
+        # Opted in with ?compress=deflate, the endpoint sets the threshold.
+        self.compress_min_bytes = None
+        if websocket.query_params.get("compress") == "deflate":
+            endpoint = "mux" if multiplexed else group_type
+            self.compress_min_bytes = COMPRESS_MIN_BYTES.get(endpoint) or None
+        # Opted in with ?heartbeat=ping, pinged and reaped when silent.
+        self.heartbeat = websocket.query_params.get("heartbeat") == "ping"
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+        self.writer: asyncio.Task | None = None
+        self.groups: set[tuple[str, int]] = set()
+        self.closed = False
+        # Loop time the in-flight send started at, None while the writer is idle.
+        self.send_started: float | None = None
+        self.last_seen = asyncio.get_running_loop().time()
+        # Inbound frame budget, see rate_limit.FrameLimiter.
+        self.frame_bucket = None
+        self.strikes = None
+        # Group frames kept back while missed messages are replayed.
+        self.held: list[Frame] | None = None
+        # The code of the client's disconnect, see frames.receive_frame().
+        self.close_code: int | None = None
+
+    def touch(self):
+        """Called for every frame the client sends, pongs included."""
+        self.last_seen = asyncio.get_running_loop().time()
+        handler_iterations.mark()
+
+
+class ConnectionManager:
+    def __init__(self, broker: Broker = None):
+        # Every index is a dict or a set, joining and leaving are O(1) whatever
+        # the size of the room.
+        # "user" groups are the /ws/me notification sockets, keyed by user id.
+        self.active_connections: dict[str, dict[int, set[Connection]]] = {
+            "chat": {},
+            "post": {},
+            "user": {},
+        }
+        self.connections: dict[WebSocket, Connection] = {}
+        self.users: dict[int, set[Connection]] = {}
+        self.broker = broker or create_broker()
+        self.evicted_count = 0
+        self.send_error_count = 0
+        self.reaped_count = 0
+        self.fanout_sizes = Histogram(FANOUT_BUCKETS)
+        self.send_latency = Histogram(SEND_LATENCY_BUCKETS)
+        self.heartbeat: asyncio.Task | None = None
+        # Set by drain(), the socket handlers refuse new connections.
+        self.draining = False
+        self.coalesce_windows = dict(COALESCE_WINDOW_SECONDS)
+        # Payloads waiting for their group's window to close, by channel.
+        self.pending: dict[str, list[bytes]] = {}
+        self.pending_flushes: dict[str, asyncio.TimerHandle] = {}
+        self.send_budget = SEND_BUDGET
+        self.lane_weights = dict(LANE_WEIGHTS)
+        # Fan-outs still being queued: group type -> channel -> fan-outs in
+        # order. A room goes to the back of its lane after every turn.
+        self.lanes: dict[str, dict[str, deque[Fanout]]] = {}
+        self.scheduled = 0
+        self.tick: asyncio.Handle | None = None
+        # Told when a user's first socket opens, their last one closes and
+        # when they join a chat, see chat.presence.PresenceTracker.
+        self.presence = None
+
+    async def start(self):
+        await self.broker.start(self.deliver)
+        self.heartbeat = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+            self.heartbeat = None
+        for handle in self.pending_flushes.values():
+            handle.cancel()
+        self.pending_flushes.clear()
+        self.pending.clear()
+        if self.tick is not None:
+            self.tick.cancel()
+            self.tick = None
+        self.lanes.clear()
+        self.scheduled = 0
+        writers = [connection.writer for connection in self.connections.values()]
+        for connection in list(self.connections.values()):
+            await self._forget(connection)
+        await asyncio.gather(*writers, return_exceptions=True)
+        await self.broker.stop()
+
+    async def drain(self, timeout: float = None, pending_writes=None):
+        """
+        Close every socket ahead of a shutdown. Waits up to ``timeout`` for
+        the outbound queues to empty and for ``pending_writes()`` (e.g. the
+        checked out DB connections) to reach zero, then closes each socket
+        with 1012 and a randomized {"reconnect_after": seconds} reason.
+        """
+        self.draining = True
+        for channel, handle in list(self.pending_flushes.items()):
+            handle.cancel()
+            self._flush_pending(channel)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (DRAIN_TIMEOUT_SECONDS if timeout is None else timeout)
+        while loop.time() < deadline and (
+            self.scheduled
+            or self.queue_depth()
+            or any(c.send_started is not None for c in self.connections.values())
+            or (pending_writes is not None and pending_writes())
+        ):
+            await asyncio.sleep(0.05)
+
+        await asyncio.gather(
+            *(
+                self._forget(
+                    connection,
+                    SERVICE_RESTART_CLOSE_CODE,
+                    dumps(
+                        {
+                            "reconnect_after": round(
+                                random.uniform(0, RECONNECT_WINDOW_SECONDS), 1
+                            )
+                        }
+                    ).decode(),
+                )
+                for connection in list(self.connections.values())
+            )
+        )
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        group_name: int = None,
+        group_type: str = None,
+        user=None,
+        token_expires_at: float = None,
+        multiplexed: bool = False,
+    ) -> Connection:
+        subprotocol = negotiate_subprotocol(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        connection = self.connections.get(websocket)
+        if connection is None:
+            connection = Connection(
+                websocket,
+                user,
+                token_expires_at,
+                multiplexed,
+                subprotocol,
+                group_type,
+            )
+            connection.writer = asyncio.create_task(self._write(connection))
+            self.connections[websocket] = connection
+            if user is not None:
+                sockets = self.users.setdefault(user.id, set())
+                if not sockets and self.presence is not None:
+                    self.presence.connected(user.id)
+                sockets.add(connection)
+
+        if group_name is not None:
+            await self.join(connection, group_name, group_type)
+        return connection
+
+    async def join(self, connection: Connection, group_name: int, group_type: str):
+        if (group_type, group_name) in connection.groups:
+            return
+        if (
+            group_type == "chat"
+            and connection.user is not None
+            and self.presence is not None
+        ):
+            # Announced before the socket is in the group, it knows it is online.
+            await self.presence.joined(connection.user.id, group_name)
+        if group_name not in self.active_connections[group_type]:
+            self.active_connections[group_type][group_name] = set()
+            # First local socket in this group, start receiving its broadcasts.
+            await self.broker.subscribe(channel_name(group_name, group_type))
+        self.active_connections[group_type][group_name].add(connection)
+        connection.groups.add((group_type, group_name))
+
+    def sockets_of(self, user_id: int) -> set[Connection]:
+        """Every local socket the user has open, across all groups."""
+        return self.users.get(user_id, set())
+
+    async def leave(self, connection: Connection, group_name: int, group_type: str):
+        """Unlike disconnect(), keeps the socket even once it is in no group."""
+        await self._leave(connection, group_name, group_type)
+
+    async def disconnect(
+        self, websocket: WebSocket, group_name: int = None, group_type: str = None
+    ):
+        """Leave one group, or every group when none is given."""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+        if group_name is not None:
+            await self._leave(connection, group_name, group_type)
+        if group_name is None or not connection.groups:
+            await self._forget(connection)
+
+    async def broadcast(self, payload: bytes, group_name: int, group_type: str):
+        """Publish an already encoded payload, see serialization.dumps()."""
+        await self.broker.publish(channel_name(group_name, group_type), payload)
+
+    def hold(self, connection: Connection):
+        """Keep group frames back until release(), control frames still go out."""
+        connection.held = []
+
+    def release(self, connection: Connection, keep=None):
+        """
+        Queue the held frames. ``keep(frame)`` returns the frame to queue in
+        its place, e.g. an array frame with some events left out, or None to
+        drop it.
+        """
+        held, connection.held = connection.held or [], None
+        for frame in held:
+            if connection.closed:
+                return
+            if keep is not None:
+                frame = keep(frame)
+                if frame is None:
+                    continue
+            try:
+                connection.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._evict(connection)
+
+    def send(self, connection: Connection, payload: bytes):
+        """Queue a frame for one local socket only, e.g. a control message."""
+        if connection.closed:
+            return
+        try:
+            connection.queue.put_nowait(Frame(payload))
+        except asyncio.QueueFull:
+            self._evict(connection)
+
+    async def deliver(self, channel: str, payload: bytes):
+        """
+        Queue a message received from the broker for every local socket in
+        the group. Never waits on a socket, slow ones are evicted instead.
+        """
+        group_type = channel.split(":", 1)[0]
+        window = self.coalesce_windows.get(group_type)
+        if not window:
+            self._fan_out(channel, Frame(payload, channel))
+            return
+
+        pending = self.pending.setdefault(channel, [])
+        pending.append(payload)
+        if len(pending) == 1:
+            self.pending_flushes[channel] = asyncio.get_running_loop().call_later(
+                window, self._flush_pending, channel
+            )
+
+    def _flush_pending(self, channel: str):
+        self.pending_flushes.pop(channel, None)
+        payloads = self.pending.pop(channel, None)
+        if not payloads:
+            return
+        if len(payloads) == 1:
+            self._fan_out(channel, Frame(payloads[0], channel))
+        else:
+            self._fan_out(channel, Frame(b"[%s]" % b",".join(payloads), channel))
+
+    def _fan_out(self, channel: str, frame: Frame):
+        """Schedule the frame for the group's sockets, see _run_tick()."""
+        group_type, group_name = channel.split(":", 1)
+        connections = list(self.active_connections[group_type].get(int(group_name), ()))
+        self.fanout_sizes.observe(len(connections))
+        if not connections:
+            return
+        lane = self.lanes.setdefault(group_type, {})
+        fanouts = lane.setdefault(channel, deque())
+        if fanouts and not fanouts[-1].queued:
+            # A busy room: the frame joins the fan-out that has not started
+            # yet, every socket then gets both with a single wake up.
+            waiting = fanouts[-1]
+            waiting.frames.append(frame)
+            waiting.connections = connections
+            if len(waiting.frames) > OUTBOUND_QUEUE_SIZE and len(fanouts) > 1:
+                # A whole queue behind, the sockets still waiting for the
+                # oldest frames are evicted as if their own queue overflowed.
+                oldest = fanouts.popleft()
+                self.scheduled -= 1
+                for connection in oldest.connections[oldest.queued :]:
+                    self._evict(connection)
+        else:
+            fanouts.append(Fanout(frame, connections))
+            self.scheduled += 1
+        if self.tick is None:
+            self.tick = asyncio.get_running_loop().call_soon(self._run_tick)
+
+    def _run_tick(self):
+        self.tick = None
+        busy = sorted(
+            (group_type for group_type, lane in self.lanes.items() if lane),
+            key=lambda group_type: -self.lane_weights.get(group_type, 1),
+        )
+        total_weight = sum(self.lane_weights.get(group_type, 1) for group_type in busy)
+        budget = self.send_budget
+        for group_type in busy:
+            share = self.send_budget * self.lane_weights.get(group_type, 1)
+            budget -= self._serve(self.lanes[group_type], max(1, share // total_weight))
+        # What a lane left of its share goes to the others, by priority.
+        for group_type in busy:
+            if budget <= 0:
+                break
+            budget -= self._serve(self.lanes[group_type], budget)
+        if self.scheduled:
+            # Next iteration, after the writers woken by this one.
+            self.tick = asyncio.get_running_loop().call_soon(self._run_tick)
+
+    def _serve(self, lane: dict[str, deque[Fanout]], quota: int) -> int:
+        """Queue frames for up to ``quota`` sockets, rooms taking turns."""
+        # The send deadline is enforced here rather than by wrapping every
+        # send in wait_for(), which would cost a task per frame per socket.
+        deadline = asyncio.get_running_loop().time() - SEND_TIMEOUT_SECONDS
+        used = 0
+        while lane and used < quota:
+            channel = next(iter(lane))
+            fanouts = lane.pop(channel)
+            fanout = fanouts[0]
+            end = min(
+                fanout.queued + min(quota - used, ROOM_QUANTUM),
+                len(fanout.connections),
+            )
+            for connection in fanout.connections[fanout.queued : end]:
+                for frame in fanout.frames:
+                    self._enqueue(connection, frame, deadline)
+            used += end - fanout.queued
+            fanout.queued = end
+            if end == len(fanout.connections):
+                fanouts.popleft()
+                self.scheduled -= 1
+            if fanouts:
+                lane[channel] = fanouts
+        return used
+
+    def _enqueue(self, connection: Connection, frame: Frame, deadline: float):
+        if connection.closed:
+            return
+        if connection.held is not None:
+            connection.held.append(frame)
+            if len(connection.held) > OUTBOUND_QUEUE_SIZE:
+                self._evict(connection)
+            return
+        if connection.send_started is not None and connection.send_started < deadline:
+            self._evict(connection)
+            return
+        try:
+            connection.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self._evict(connection)
+
+    def queue_depth(self) -> int:
+        return sum(connection.queue.qsize() for connection in self.connections.values())
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.connections),
+            "queue_depth": self.queue_depth(),
+            "evicted": self.evicted_count,
+            "send_errors": self.send_error_count,
+            "reaped": self.reaped_count,
+            "draining": self.draining,
+        }
+
+    def sweep(self):
+        """
+        Evict the sockets stuck in a send. Of those opted in to the heartbeat,
+        reap the ones that went silent and ping the rest: half-open TCP
+        sessions never raise WebSocketDisconnect, this is what removes them.
+        """
+        now = asyncio.get_running_loop().time()
+        idle_deadline = now - IDLE_TIMEOUT_SECONDS
+        send_deadline = now - SEND_TIMEOUT_SECONDS
+        for connection in list(self.connections.values()):
+            if connection.closed:
+                continue
+            if connection.heartbeat and connection.last_seen < idle_deadline:
+                connection.closed = True
+                self.reaped_count += 1
+                asyncio.create_task(self._forget(connection, IDLE_CLOSE_CODE))
+                continue
+            if (
+                connection.send_started is not None
+                and connection.send_started < send_deadline
+            ):
+                self._evict(connection)
+                continue
+            if not connection.heartbeat:
+                continue
+            try:
+                connection.queue.put_nowait(PING_FRAME)
+            except asyncio.QueueFull:
+                self._evict(connection)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Heartbeat error: {e}")
+
+    async def _write(self, connection: Connection):
+        loop = asyncio.get_running_loop()
+        while not connection.closed:
+            frame = await connection.queue.get()
+            if connection.multiplexed:
+                frame = frame.tagged()
+            connection.send_started = loop.time()
+            try:
+                if (
+                    connection.compress_min_bytes is not None
+                    and len(frame.data) >= connection.compress_min_bytes
+                ):
+                    await connection.websocket.send_bytes(
+                        frame.compressed(connection.msgpack)
+                    )
+                elif connection.msgpack:
+                    await connection.websocket.send_bytes(frame.packed)
+                elif connection.binary:
+                    await connection.websocket.send_bytes(frame.data)
+                else:
+                    await connection.websocket.send_text(frame.text)
+            except Exception as e:
+                self.send_error_count += 1
+                print(f"Error sending message to {connection.websocket.client}: {e}")
+                connection.closed = True
+                asyncio.create_task(self._forget(connection))
+                return
+            self.send_latency.observe(loop.time() - connection.send_started)
+            connection.send_started = None
+
+    def _evict(self, connection: Connection):
+        if connection.closed:
+            return
+        connection.closed = True
+        self.evicted_count += 1
+        asyncio.create_task(self._forget(connection, SLOW_CONSUMER_CLOSE_CODE))
+
+    async def _leave(self, connection: Connection, group_name: int, group_type: str):
+        connection.groups.discard((group_type, group_name))
+        connections = self.active_connections[group_type].get(group_name)
+        if connections is None or connection not in connections:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self.active_connections[group_type][group_name]
+            await self.broker.unsubscribe(channel_name(group_name, group_type))
+
+    async def _forget(
+        self, connection: Connection, close_code: int = None, reason: str = None
+    ):
+        """Drop the connection from every group and stop its writer."""
+        if not connection.closed and connection.close_code == PING_TIMEOUT_CLOSE_CODE:
+            self.reaped_count += 1
+        connection.closed = True
+        for group_type, group_name in list(connection.groups):
+            await self._leave(connection, group_name, group_type)
+        self.connections.pop(connection.websocket, None)
+        if connection.user is not None:
+            sockets = self.users.get(connection.user.id)
+            if sockets is not None:
+                sockets.discard(connection)
+                if not sockets:
+                    del self.users[connection.user.id]
+                    if self.presence is not None:
+                        self.presence.disconnected(connection.user.id)
+
+        if connection.writer is not None:
+            connection.writer.cancel()
+
+        if close_code is not None:
+            try:
+                await asyncio.wait_for(
+                    connection.websocket.close(code=close_code, reason=reason),
+                    timeout=SEND_TIMEOUT_SECONDS,
+                )
+            except Exception:
+                pass
+
+
+manager = ConnectionManager()
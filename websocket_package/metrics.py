@@ -0,0 +1,128 @@
+import bisect
+import heapq
+import time
+
+# Sockets an event was queued for, per broadcast.
+FANOUT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+SEND_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+# Metrics that only ever grow, exported as Prometheus counters.
+COUNTERS = (
+    "evicted",
+    "send_errors",
+    "reaped",
+    "throttled",
+    "throttle_closes",
+    "handler_iterations",
+)
+
+
+class Histogram:
+    """Fixed buckets, an observation is a bisect and an increment."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        """Cumulative bucket counts keyed by upper bound, as Prometheus has them."""
+        buckets = {}
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            buckets[str(bound)] = total
+        buckets["+Inf"] = self.count
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+class RateMeter:
+    """Event counter that also knows the rate over the last full second."""
+
+    __slots__ = ("count", "rate", "window_started", "window_count")
+
+    def __init__(self):
+        self.count = 0
+        self.rate = 0.0
+        self.window_started = time.monotonic()
+        self.window_count = 0
+
+    def mark(self):
+        self.count += 1
+        self.window_count += 1
+        now = time.monotonic()
+        if now - self.window_started >= 1:
+            self.rate = self.window_count / (now - self.window_started)
+            self.window_started = now
+            self.window_count = 0
+
+    def per_second(self) -> float:
+        # A stopped stream has no mark() left to close its window.
+        if time.monotonic() - self.window_started >= 2:
+            return 0.0
+        return self.rate
+
+
+# Every frame received by any socket handler, see Connection.touch().
+handler_iterations = RateMeter()
+
+
+def collect(manager, top: int = 10) -> dict:
+    """Everything the manager knows, computed on demand for a scrape."""
+    sockets_by_group_type = {}
+    groups = []
+    for group_type, rooms in manager.active_connections.items():
+        sockets_by_group_type[group_type] = sum(len(room) for room in rooms.values())
+        groups.extend(
+            (len(room), group_type, group_name) for group_name, room in rooms.items()
+        )
+
+    return {
+        **manager.stats(),
+        "sockets_by_group_type": sockets_by_group_type,
+        "top_groups": [
+            {"group_type": group_type, "group": group_name, "sockets": sockets}
+            for sockets, group_type, group_name in heapq.nlargest(top, groups)
+        ],
+        "fanout_size": manager.fanout_sizes.snapshot(),
+        "send_latency_seconds": manager.send_latency.snapshot(),
+        "handler_iterations": handler_iterations.count,
+        "handler_iterations_per_second": handler_iterations.per_second(),
+    }
+
+
+def render_prometheus(metrics: dict) -> str:
+    lines = []
+    for name, value in metrics.items():
+        metric = f"ws_{name}"
+        if name == "sockets_by_group_type":
+            lines.append(f"# TYPE {metric} gauge")
+            for group_type, sockets in value.items():
+                lines.append(f'{metric}{{group_type="{group_type}"}} {sockets}')
+        elif name == "top_groups":
+            lines.append("# TYPE ws_group_sockets gauge")
+            for group in value:
+                lines.append(
+                    f'ws_group_sockets{{group_type="{group["group_type"]}",'
+                    f'group="{group["group"]}"}} {group["sockets"]}'
+                )
+        elif isinstance(value, dict):
+            lines.append(f"# TYPE {metric} histogram")
+            for bound, count in value["buckets"].items():
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+            lines.append(f"{metric}_sum {value['sum']}")
+            lines.append(f"{metric}_count {value['count']}")
+        elif name in COUNTERS:
+            lines.append(f"# TYPE {metric}_total counter")
+            lines.append(f"{metric}_total {value}")
+        else:
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {int(value) if isinstance(value, bool) else value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,17 @@
+from websocket_package.manager import manager
+from websocket_package.serialization import dumps
+
+# Notifications carry the start of a message or comment, not the whole text.
+PREVIEW_LENGTH = 100
+
+
+def preview(content: str) -> str:
+    return content[:PREVIEW_LENGTH]
+
+
+async def notify(user_id: int, event: dict):
+    """
+    Publish a compact event to the user's /ws/me sockets, on every worker.
+    ``event["type"]`` names it, e.g. "post.liked".
+    """
+    await manager.broadcast(dumps(event), user_id, "user")
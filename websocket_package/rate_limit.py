@@ -0,0 +1,109 @@
+import os
+import time
+
+CONNECTION_FRAMES_PER_SECOND = float(os.getenv("WS_CONNECTION_FRAMES_PER_SECOND", 5))
+CONNECTION_FRAME_BURST = float(os.getenv("WS_CONNECTION_FRAME_BURST", 20))
+# Shared by every socket of the user, opening more sockets buys no budget.
+USER_FRAMES_PER_SECOND = float(os.getenv("WS_USER_FRAMES_PER_SECOND", 10))
+USER_FRAME_BURST = float(os.getenv("WS_USER_FRAME_BURST", 40))
+# Throttled frames a connection may send before it is closed. One strike is
+# forgiven every STRIKE_FORGIVE_SECONDS.
+THROTTLE_STRIKES = float(os.getenv("WS_THROTTLE_STRIKES", 20))
+STRIKE_FORGIVE_SECONDS = 5
+# 1008 "Policy Violation".
+THROTTLE_CLOSE_CODE = 1008
+# Full buckets are indistinguishable from new ones and are dropped this often.
+PRUNE_INTERVAL_SECONDS = 60
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now: float) -> bool:
+        self.refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self) -> float:
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class FrameLimiter:
+    """
+    Token buckets for frames received on the sockets, one per connection and
+    one per user. A frame has to fit in both budgets to be handled.
+    """
+
+    def __init__(self):
+        self.user_buckets: dict[int, TokenBucket] = {}
+        self.throttled_count = 0
+        self.closed_count = 0
+        self.pruned_at = time.monotonic()
+
+    def allow(self, connection, now: float = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if connection.frame_bucket is None:
+            connection.frame_bucket = TokenBucket(
+                CONNECTION_FRAMES_PER_SECOND, CONNECTION_FRAME_BURST, now
+            )
+            connection.strikes = TokenBucket(
+                1 / STRIKE_FORGIVE_SECONDS, THROTTLE_STRIKES, now
+            )
+        user_bucket = self.user_buckets.get(connection.user.id)
+        if user_bucket is None:
+            user_bucket = TokenBucket(USER_FRAMES_PER_SECOND, USER_FRAME_BURST, now)
+            self.user_buckets[connection.user.id] = user_bucket
+
+        if now - self.pruned_at > PRUNE_INTERVAL_SECONDS:
+            self.prune(now)
+
+        # Checked first so a throttled connection does not drain the user's budget.
+        connection.frame_bucket.refill(now)
+        if connection.frame_bucket.tokens >= 1 and user_bucket.take(now):
+            connection.frame_bucket.tokens -= 1
+            return True
+        self.throttled_count += 1
+        return False
+
+    def strike(self, connection, now: float = None) -> bool:
+        """Count a throttled frame, False once the connection has to be closed."""
+        now = time.monotonic() if now is None else now
+        if connection.strikes.take(now):
+            return True
+        self.closed_count += 1
+        return False
+
+    def retry_after(self, connection) -> float:
+        user_bucket = self.user_buckets.get(connection.user.id)
+        return max(
+            connection.frame_bucket.retry_after(),
+            user_bucket.retry_after() if user_bucket is not None else 0.0,
+        )
+
+    def prune(self, now: float):
+        for user_id, bucket in list(self.user_buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self.user_buckets[user_id]
+        self.pruned_at = now
+
+    def stats(self) -> dict:
+        return {
+            "throttled": self.throttled_count,
+            "throttle_closes": self.closed_count,
+        }
+
+
+frame_limiter = FrameLimiter()
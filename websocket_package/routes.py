@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from db import models
+from db.engine import pool_checked_out
+from dependencies import require_role
+from websocket_package.manager import manager
+from websocket_package.metrics import collect, render_prometheus
+from websocket_package.rate_limit import frame_limiter
+
+router = APIRouter()
+
+
+def websocket_metrics(top: int) -> dict:
+    return {
+        **collect(manager, top),
+        **frame_limiter.stats(),
+        "db_pool_checked_out": pool_checked_out(),
+    }
+
+
+@router.get("/metrics/websockets")
+async def get_websocket_metrics(
+    top: int = 10,
+    current_user: models.DBUser = Depends(require_role(models.Role.admin)),
+):
+    return websocket_metrics(top)
+
+
+@router.get("/metrics/websockets/prometheus", response_class=PlainTextResponse)
+async def get_websocket_metrics_prometheus(
+    top: int = 10,
+    current_user: models.DBUser = Depends(require_role(models.Role.admin)),
+):
+    return render_prometheus(websocket_metrics(top))
@@ -0,0 +1,82 @@
+import os
+import zlib
+from datetime import datetime, timezone
+
+import msgpack
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+# Same output as the serializers' json_encoders: UTC timestamps ending in "Z".
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Offered by the client in Sec-WebSocket-Protocol, JSON stays the default.
+MSGPACK_SUBPROTOCOL = "msgpack"
+JSON_SUBPROTOCOL = "json"
+# zlib level of the frames compressed for sockets opened with ?compress=deflate,
+# higher levels barely shrink socket frames further (benchmarks/ws_compression.py).
+COMPRESSION_LEVEL = int(os.getenv("WS_COMPRESSION_LEVEL", 1))
+
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, option=ORJSON_OPTIONS)
+
+
+def dump_model(model: BaseModel) -> bytes:
+    return dumps(model.model_dump())
+
+
+def _msgpack_default(value):
+    # Only naive timestamps get here, they are UTC like ORJSON_OPTIONS has them.
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def packb(data) -> bytes:
+    """msgpack, timestamps use the Timestamp extension type."""
+    return msgpack.packb(data, datetime=True, default=_msgpack_default)
+
+
+def unpackb(data: bytes):
+    return msgpack.unpackb(data, timestamp=3)
+
+
+def json_to_msgpack(data: bytes) -> bytes:
+    return packb(orjson.loads(data))
+
+
+def compress(data: bytes) -> bytes:
+    """
+    zlib stream, its first byte is always 0x78. JSON starts with "{" or "["
+    and our msgpack frames with a map or array marker, so a client tells a
+    compressed binary frame apart by that byte alone.
+    """
+    return zlib.compress(data, COMPRESSION_LEVEL)
+
+
+def negotiate_subprotocol(websocket) -> str | None:
+    """The subprotocol to accept, a client that offered some must get one back."""
+    offered = websocket.scope.get("subprotocols") or []
+    if MSGPACK_SUBPROTOCOL in offered:
+        return MSGPACK_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in offered:
+        return JSON_SUBPROTOCOL
+    return None
+
+
+def accepts_msgpack(request: Request, response: Response) -> bool:
+    # The body depends on Accept, shared caches must not mix the two up.
+    response.headers["Vary"] = "Accept"
+    accept = request.headers.get("accept", "")
+    return MSGPACK_MEDIA_TYPE in accept or "application/x-msgpack" in accept
+
+
+def msgpack_response(model: BaseModel, response: Response) -> Response:
+    """
+    A msgpack encoded model. The headers set on ``response`` so far, such as
+    the refreshed token cookies, are carried over.
+    """
+    packed = Response(packb(model.model_dump()), media_type=MSGPACK_MEDIA_TYPE)
+    packed.raw_headers.extend(response.raw_headers)
+    return packed